@@ -0,0 +1,348 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import contextlib
+
+from qchess.quantum_chess import QChess, ENGINES
+from qchess.tutorial_qchess import TutorialQChess
+from qchess.point import Point
+from qchess.piece import *
+from qchess.pawn import Pawn
+
+MOVE_KINDS = ['standard', 'split', 'merge', 'capture_slide', 'castling', 'en_passant']
+
+#random moves tried before the game is considered stuck
+MAX_ATTEMPTS = 200
+
+#games started to play the moves of a random sequence before giving up
+MAX_GAMES = 50
+
+"""
+    Returns which of MOVE_KINDS the move would be, given its index in qchess.move_types.
+"""
+def get_move_kind(qchess, move_index, points):
+    if move_index == 1:
+        return 'split'
+
+    if move_index == 2:
+        return 'merge'
+
+    source, target = points
+    piece = qchess.board[source.x][source.y]
+    target_piece = qchess.board[target.x][target.y]
+
+    if piece.type == PieceType.KING and not piece.has_moved:
+        for castling_type in qchess.castling_types:
+            if castling_type['king_start_square'] == source and castling_type['king_end_square'] == target:
+                return 'castling'
+
+    if piece.type == PieceType.PAWN:
+        if piece.is_move_valid(source, target, qchess=qchess)[0] == Pawn.MoveType.EN_PASSANT:
+            return 'en_passant'
+
+    elif piece.is_move_slide() and target_piece != NullPiece and target_piece.color != piece.color:
+        return 'capture_slide'
+
+    return 'standard'
+
+"""
+Plays moves on a game and records the cost of each one by move kind.
+"""
+class Benchmark:
+    def __init__(self):
+        self.moves = {kind: [] for kind in MOVE_KINDS}
+
+    """
+        Performs the move with the function in qchess.move_types and records it if it's valid.
+        Returns if the move was valid.
+    """
+    def perform(self, qchess, move_index, points):
+        kind = get_move_kind(qchess, move_index, points)
+        engine = qchess.engine
+
+        measurements = engine.measurement_count
+        simulations = engine.simulation_count
+
+        #only QiskitEngine has a circuit
+        simulated_instructions = getattr(engine, 'simulated_instructions', None)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            success = qchess.move_types[move_index]['func'](qchess, *points)
+            elapsed = time.perf_counter() - start
+
+        if success:
+            #the circuit left to simulate (the whole circuit in non-incremental mode)
+            circuit = getattr(engine, 'qcircuit', None)
+
+            self.moves[kind].append({
+                'time': elapsed,
+                'measurements': engine.measurement_count - measurements,
+                'simulations': engine.simulation_count - simulations,
+                'simulated_instructions': (
+                    None if simulated_instructions is None
+                    else engine.simulated_instructions - simulated_instructions
+                ),
+                'circuit_size': circuit.size() if circuit is not None else None,
+                'circuit_depth': circuit.depth() if circuit is not None else None,
+                #KB on Linux, for the whole process so far
+                'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            })
+
+        return success
+
+    def get_summary(self):
+        summary = {}
+
+        for kind, moves in self.moves.items():
+            if not moves:
+                continue
+
+            #only QiskitEngine has a circuit
+            has_circuit = moves[0]['circuit_size'] is not None
+
+            summary[kind] = {
+                'count': len(moves),
+                'total_time': sum(move['time'] for move in moves),
+                'mean_time': sum(move['time'] for move in moves) / len(moves),
+                'max_time': max(move['time'] for move in moves),
+                'measurements': sum(move['measurements'] for move in moves),
+                'simulations': sum(move['simulations'] for move in moves),
+                'simulated_instructions': sum(move['simulated_instructions'] for move in moves) if has_circuit else None,
+                'max_circuit_size': max(move['circuit_size'] for move in moves) if has_circuit else None,
+                'max_circuit_depth': max(move['circuit_depth'] for move in moves) if has_circuit else None,
+                'peak_rss': max(move['peak_rss'] for move in moves)
+            }
+
+        return summary
+
+"""
+    Returns the squares the piece in source can move to (ignoring the state of the board).
+"""
+def get_targets(qchess, source):
+    piece = qchess.board[source.x][source.y]
+    targets = []
+
+    for x in range(qchess.width):
+        for y in range(qchess.height):
+            target = Point(x, y)
+
+            if piece.type == PieceType.PAWN:
+                valid = piece.is_move_valid(source, target, qchess=qchess)[0] != Pawn.MoveType.INVALID
+            else:
+                valid = source != target and piece.is_move_valid(source, target)
+
+            if valid:
+                targets.append(target)
+
+    for castling_type in qchess.castling_types:
+        if piece.type == PieceType.KING and castling_type['king_start_square'] == source:
+            targets.append(castling_type['king_end_square'])
+
+    return targets
+
+"""
+    Returns all the moves of the type in qchess.move_types from the given sources
+    (ignoring the state of the board), as lists of points.
+"""
+def get_moves(qchess, move_index, sources):
+    moves = []
+
+    for source in sources:
+        piece = qchess.board[source.x][source.y]
+        targets = get_targets(qchess, source)
+
+        if move_index == 0:
+            moves += [[source, target] for target in targets]
+
+        elif move_index == 1:
+            moves += [[source, target1, target2] for target1 in targets for target2 in targets if target1 != target2]
+
+        else:
+            for x in range(qchess.width):
+                for y in range(qchess.height):
+                    other = qchess.board[x][y]
+
+                    if Point(x, y) == source or other.type != piece.type or other.color != piece.color:
+                        continue
+
+                    other_targets = get_targets(qchess, Point(x, y))
+                    moves += [[source, Point(x, y), target] for target in targets if target in other_targets]
+
+    return moves
+
+"""
+    Returns a random move of the current player as (move_index, points), or None
+    if the piece picked has no moves of the type picked. Split and merge moves are less frequent.
+"""
+def get_random_move(qchess, rng):
+    sources = [
+        Point(x, y) for x in range(qchess.width) for y in range(qchess.height)
+        if qchess.board[x][y] != NullPiece and qchess.board[x][y].color == qchess.current_turn
+    ]
+
+    if not sources:
+        return None
+
+    move_index = rng.choice([0, 0, 0, 1, 2])
+    moves = get_moves(qchess, move_index, [rng.choice(sources)])
+
+    if not moves:
+        return None
+
+    return move_index, rng.choice(moves)
+
+"""
+    Plays random moves until the game ends, gets stuck or num_moves are played.
+    Returns the number of moves played.
+"""
+def play_random_game(qchess, benchmark, rng, num_moves):
+    for i in range(num_moves):
+        for attempt in range(MAX_ATTEMPTS):
+            move = get_random_move(qchess, rng)
+
+            if move and benchmark.perform(qchess, *move):
+                qchess.current_turn = Color.opposite(qchess.current_turn)
+                break
+        else:
+            return i
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            if qchess.is_game_over():
+                return i + 1
+
+    return num_moves
+
+"""
+    Plays num_moves random moves on the game mode, starting a new game whenever one ends
+    (some positions end after a couple of moves). Returns the number of games played.
+"""
+def play_random(mode, benchmark, engine, rng, num_moves):
+    moves = 0
+
+    for game in range(MAX_GAMES):
+        qchess = QChess(0, 0, game_mode=mode, engine=engine, seed=rng.randrange(2**31))
+        moves += play_random_game(qchess, benchmark, rng, num_moves - moves)
+
+        if moves == num_moves:
+            break
+
+    return game + 1
+
+"""
+    Plays a tutorial step by step, with a random move of those the step allows.
+"""
+def play_tutorial(mode, benchmark, engine, rng):
+    qchess = TutorialQChess(mode, engine=engine, seed=rng.randrange(2**31))
+
+    while not qchess.ended:
+        if qchess.collapse_allowed:
+            with contextlib.redirect_stdout(io.StringIO()):
+                qchess.collapse_board()
+
+            continue
+
+        valid_moves = qchess.tutorial_steps[qchess.step_index]['valid_moves']
+
+        sources = valid_moves.get('source', [
+            Point(x, y) for x in range(qchess.width) for y in range(qchess.height)
+            if qchess.board[x][y] != NullPiece
+        ])
+
+        moves = [
+            (move_index, points) for move_index, move_type in enumerate(qchess.move_types)
+            if move_type['name'] in valid_moves.get('move_type', [move_type['name']])
+            for points in get_moves(qchess, move_index, sources)
+        ]
+
+        rng.shuffle(moves)
+
+        #TutorialQChess rejects the moves the step doesn't allow
+        for move in moves:
+            if benchmark.perform(qchess, *move):
+                break
+        else:
+            return
+
+"""
+    Tutorials are played following their steps (their positions usually end after
+    a move or two if played randomly) and game modes with random moves.
+"""
+def run_file(path, args):
+    mode = json.load(open(path))
+    results = []
+
+    for i in range(args.games):
+        seed = args.seed + i
+        rng = random.Random(seed)
+        benchmark = Benchmark()
+
+        start = time.perf_counter()
+
+        if 'tutorial_steps' in mode:
+            sequence = 'scripted'
+            games = 1
+            play_tutorial(mode, benchmark, args.engine, rng)
+        else:
+            sequence = 'random'
+            games = play_random(mode, benchmark, args.engine, rng, args.moves)
+
+        results.append({
+            'file': path,
+            'sequence': sequence,
+            'engine': args.engine or mode.get('engine', 'qiskit'),
+            'seed': seed,
+            'games': games,
+            'moves': sum(len(moves) for moves in benchmark.moves.values()),
+            'time': time.perf_counter() - start,
+            'kinds': benchmark.get_summary()
+        })
+
+        print('{} ({}, {}): {} moves in {:.2f}s'.format(
+            path, sequence, results[-1]['engine'], results[-1]['moves'], results[-1]['time']
+        ))
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantum Chess benchmarks.')
+
+    parser.add_argument('--engine', help='engine used in all games (default: the one in each file, or qiskit)',
+                        choices=ENGINES.keys())
+
+    parser.add_argument('--seed', help='seed of the first game of each file (default: 0)', type=int, default=0)
+
+    parser.add_argument('--games', help='move sequences played on each file (default: 1)', type=int, default=1)
+
+    parser.add_argument('--moves', help='moves of each random sequence (default: 30)', type=int, default=30)
+
+    parser.add_argument('--output', help='JSON file the results are written to (default: benchmarks/results.json)',
+                        default=os.path.join('benchmarks', 'results.json'))
+
+    parser.add_argument('files', help='game mode or tutorial files (default: all of them)', nargs='*')
+
+    args = parser.parse_args()
+
+    files = args.files
+
+    if not files:
+        for directory in ['game_modes', 'tutorials']:
+            files += sorted(
+                os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')
+            )
+
+    results = []
+
+    for path in files:
+        results += run_file(path, args)
+
+    with open(args.output, 'w') as output:
+        json.dump({'python': sys.version, 'results': results}, output, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ import sys
 import argparse
 import json
 
-from qchess.quantum_chess import QChess
+from qchess.quantum_chess import QChess, ENGINES
 from qchess.tutorial_qchess import TutorialQChess
 from qchess.tutorial_progress import TutorialProgress
 
@@ -24,6 +24,12 @@ def main():
     parser.add_argument('--ascii-render', help='use the basic ascii renderer instead of PySimpleGUI',
                         action='store_true')
 
+    parser.add_argument('--engine', help='select the engine used to simulate the game (default: qiskit, or the one in the game mode file)',
+                        choices=ENGINES.keys())
+
+    parser.add_argument('--seed', help='seed the random outcomes of the game, so that the same moves always give the same result',
+                        type=int)
+
     group = parser.add_mutually_exclusive_group()
 
     group.add_argument('--game-mode', help='select a specific game mode from its configuration file in game_modes/',
@@ -36,7 +42,7 @@ def main():
     args = parser.parse_args()
 
     if args.guided_tutorials:
-        tutorial_progress = TutorialProgress(args.ascii_render)
+        tutorial_progress = TutorialProgress(args.ascii_render, engine=args.engine, seed=args.seed)
         tutorial_progress.main_loop()
 
     else:
@@ -48,7 +54,7 @@ def main():
                 print('Please note that the ' + epilog)
                 return
 
-            qchess = TutorialQChess(json.load(json_data))
+            qchess = TutorialQChess(json.load(json_data), engine=args.engine, seed=args.seed)
 
         else:
             try:
@@ -58,7 +64,7 @@ def main():
                 print('Please note that the ' + epilog)
                 return
 
-            qchess = QChess(0, 0, game_mode=json.load(json_data))
+            qchess = QChess(0, 0, game_mode=json.load(json_data), engine=args.engine, seed=args.seed)
 
             print('\nRemember to give the program some time if it freezes (simulations may take a while)\n')
 
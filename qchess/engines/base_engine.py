@@ -64,6 +64,39 @@ class BaseEngine(ABC):
     def castling_move(self, king_source, rook_source, king_target, rook_target):
         raise NotImplementedError()
 
+    """
+    Measures the qubits of the squares with the given indices and returns their
+    values (0 or 1) in the same order. The stored state collapses in place, so
+    the qubits are left in the measured state without simulating anything again.
+    The classical board isn't updated (collapse_point does that).
+
+    Required by the engines to collapse pieces.
+    """
+    @abstractmethod
+    def measure_qubits(self, indices):
+        raise NotImplementedError()
+
+    """
+    Returns the probability of every square (indexed like the array of the board)
+    being occupied as a NumPy array, without collapsing anything.
+
+    Required by QChess to display the board and to analyze the game.
+    """
+    @abstractmethod
+    def get_square_probabilities(self):
+        raise NotImplementedError()
+
+    """
+    Returns n samples of which squares are occupied as a boolean NumPy array
+    of shape (n, width * height), drawn as if the whole board was collapsed
+    but without collapsing anything.
+
+    Required by QChess to sample boards.
+    """
+    @abstractmethod
+    def sample_squares(self, n):
+        raise NotImplementedError()
+
     """
     Collapse all pieces entangled with a the piece on (x, y)
 
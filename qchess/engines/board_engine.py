@@ -0,0 +1,697 @@
+from abc import abstractmethod
+
+import numpy as np
+
+from qchess.point import Point
+from qchess.piece import *
+from qchess.pawn import Pawn
+
+from .base_engine import BaseEngine
+from .entanglement_index import EntanglementIndex
+
+"""
+Implements the rules of QChess for engines where each square of the board
+is represented by one qubit (|1> if there's a piece in it, |0> otherwise).
+
+It keeps the classical board and the entanglement information (qflags and
+the entanglement index) updated,
+while the quantum operations are delegated to the move gadgets in the module
+utils (qutils for QiskitEngine) and to the methods below that subclasses implement.
+"""
+class BoardEngine(BaseEngine):
+    def __init__(self, qchess, width, height):
+        self.qchess = qchess
+        self.classical_board = qchess.board
+        self.width = width
+        self.height = height
+
+        NullPiece.qflag = 0
+
+        self.entanglement = EntanglementIndex()
+
+        #used to profile the engines: number of measurements of squares (see collapse_by_flag)
+        #and number of simulations of the state (only counted by engines that use a simulator)
+        self.measurement_count = 0
+        self.simulation_count = 0
+
+        #used to sample boards (see sample_squares), derived from the seed of the game but
+        #separate from the measurements, so looking at the board never changes the game
+        self.sample_rng = np.random.default_rng(np.random.SeedSequence(qchess.seed).spawn(1)[0])
+
+        self.reset_state()
+
+    """
+    Sets all the qubits to the state of the classical board.
+    Called when the engine is created and after all pieces are collapsed.
+    """
+    @abstractmethod
+    def reset_state(self):
+        raise NotImplementedError()
+
+    """
+    Adds a piece with 100% probability to the empty square with index i.
+    """
+    @abstractmethod
+    def set_occupied(self, i):
+        raise NotImplementedError()
+
+    """
+    Removes the piece of the square with index i, which is known to be there with 100% probability.
+    """
+    @abstractmethod
+    def set_empty(self, i):
+        raise NotImplementedError()
+
+    """
+    Returns the probability of the qubits of the squares with the
+    given indices being |1>, in the same order, without measuring them.
+    """
+    @abstractmethod
+    def get_qubit_probabilities(self, indices):
+        raise NotImplementedError()
+
+    """
+    Returns n samples of the values of the qubits of the squares with the given
+    indices as an array of shape (n, len(indices)), without measuring them.
+    They must be drawn from sample_rng.
+    """
+    @abstractmethod
+    def sample_qubits(self, indices, n):
+        raise NotImplementedError()
+
+    def on_add_piece(self, x, y, piece):
+        piece.qflag = self.new_qflag()
+
+        index = self.qchess.get_array_index(x, y)
+        self.entanglement.set_square(index, piece.qflag)
+
+        #the value is already |0> (no piece)
+        #since we want to add the piece with 100% probability, we swap to |1>
+        self.set_occupied(index)
+
+    def new_qflag(self):
+        return self.entanglement.new_label()
+
+    """
+    Called when a piece might have left the board (captured or measured away).
+    Its qflag is recycled at the start of the next move if it's still unused.
+    """
+    def release_qflag(self, qflag):
+        if qflag:
+            self.entanglement.release_label(qflag)
+
+    """
+    Places a piece in the classical board, keeping the entanglement index updated.
+    """
+    def set_piece(self, point, piece):
+        self.classical_board[point.x][point.y] = piece
+        self.entanglement.set_square(self.qchess.get_array_index(point.x, point.y), piece.qflag)
+
+    def on_pawn_promotion(self, promoted_pawn, pawn):
+        promoted_pawn.qflag = pawn.qflag
+
+    def get_all_entangled_points(self, x, y):
+        qflag = self.classical_board[x][y].qflag
+
+        return [self.qchess.get_board_point(i) for i in sorted(self.entanglement.get_squares(qflag))]
+
+    def entangle_flags(self, qflag1, qflag2):
+        #nullpiece
+        if not qflag1 or not qflag2:
+            return
+
+        self.entanglement.entangle(qflag1, qflag2)
+
+    def entangle_path_flags(self, qflag, source, target):
+        all_qflags = 0
+
+        pieces = self.qchess.get_path_pieces(source, target)
+
+        for piece in pieces:
+            all_qflags |= piece.qflag
+        
+        self.entangle_flags(all_qflags, qflag)
+
+        return bool(pieces)
+
+    def collapse_by_flag(self, qflag, collapse_all=False):
+        #nullpiece
+        if not qflag and not collapse_all:
+            return
+
+        if collapse_all:
+            squares = sorted(self.entanglement.get_occupied_squares())
+        else:
+            squares = sorted(self.entanglement.get_squares(qflag))
+
+        collapsed_indices = [i for i in squares if not self.qchess.get_piece(i).collapsed]
+
+        if collapsed_indices:
+            self.measurement_count += 1
+            values = self.measure_qubits(collapsed_indices)
+
+            for i, value in zip(collapsed_indices, values):
+                pos = self.qchess.get_board_point(i)
+
+                if value == 0:
+                    self.set_piece(pos, NullPiece)
+
+                else:
+                    piece = self.qchess.get_piece(i)
+                    assert(piece != NullPiece)
+                    piece.collapsed = True
+
+            #the pieces are not entangled anymore, so each one gets its own qflag
+            #(since we can't be 100% sure of the original qflag of a piece
+            #we assign them in order from the ones used by the group)
+            if not collapse_all:
+                qflags = sorted(self.entanglement.split_groups(qflag))
+
+                for i in squares:
+                    piece = self.qchess.get_piece(i)
+                    if piece == NullPiece: continue
+
+                    #there should always be enough qflags for every collapsed piece
+                    piece.qflag = qflags.pop(0) if qflags else self.new_qflag()
+                    self.entanglement.set_square(i, piece.qflag)
+
+                #the rest belonged to pieces that are not in the board anymore
+                for qflag in qflags:
+                    self.release_qflag(qflag)
+
+        #assign new qflags to all the pieces
+        if collapse_all:
+            self.entanglement = EntanglementIndex()
+
+            for i in squares:
+                piece = self.qchess.get_piece(i)
+                if piece == NullPiece: continue
+                
+                piece.qflag = self.new_qflag()
+                self.entanglement.set_square(i, piece.qflag)
+        
+        all_collapsed = collapse_all
+
+        if not all_collapsed:
+            all_collapsed = all(
+                self.qchess.get_piece(i).collapsed for i in self.entanglement.get_occupied_squares()
+            )
+
+        #the circuit is reset when all pieces are collapsed, even if
+        #no new pieces were collapsed in this call
+        #when all the qubits are |0> or |1>, it's cheaper to just reset
+        #the circuit than to keep track of all the qubits operations
+        if all_collapsed:
+            self.reset_state()
+
+    def set_piece_uncollapsed(self, point):
+        if self.classical_board[point.x][point.y] != NullPiece:
+            self.classical_board[point.x][point.y].collapsed = False
+
+    def collapse_path(self, source, target, collapse_target=False, collapse_source=False):
+        qflag = 0
+
+        for piece in self.qchess.get_path_pieces(source, target):
+            qflag |= piece.qflag
+
+        source_piece = self.classical_board[source.x][source.y]
+        if source_piece != NullPiece and collapse_source:
+            #force the piece to get collapsed
+            source_piece.collapsed = False
+
+            qflag |= source_piece.qflag
+
+        target_piece = self.classical_board[target.x][target.y]
+        if target_piece != NullPiece and collapse_source:
+            #force the piece to get collapsed
+            target_piece.collapsed = False
+
+            qflag |= target_piece.qflag
+
+        self.collapse_by_flag(qflag)
+
+        #return true if path is clear after collapse
+        return not bool(self.qchess.get_path_pieces(source, target))
+
+    """
+        Returns the points that might be occupied or not, skipping the ones known to be empty.
+        Used by the move gadgets to only control on the squares whose value is unknown.
+        Returns None if any of the points is known to be occupied (a collapsed piece).
+    """
+    def get_uncertain_points(self, points):
+        uncertain_points = []
+
+        for point in points:
+            piece = self.classical_board[point.x][point.y]
+
+            if piece == NullPiece:
+                continue
+
+            if piece.collapsed:
+                return None
+
+            uncertain_points.append(point)
+
+        return uncertain_points
+
+    def get_square_probabilities(self):
+        probabilities = np.zeros(self.width * self.height)
+        uncertain_indices = []
+
+        for i in self.entanglement.get_occupied_squares():
+            if self.qchess.get_piece(i).collapsed:
+                probabilities[i] = 1
+            else:
+                uncertain_indices.append(i)
+
+        #only the squares that might be empty are calculated by the engine
+        if uncertain_indices:
+            probabilities[uncertain_indices] = self.get_qubit_probabilities(uncertain_indices)
+
+        return probabilities
+
+    def sample_squares(self, n):
+        samples = np.zeros((n, self.width * self.height), dtype=bool)
+        uncertain_indices = []
+
+        for i in self.entanglement.get_occupied_squares():
+            if self.qchess.get_piece(i).collapsed:
+                samples[:, i] = True
+            else:
+                uncertain_indices.append(i)
+
+        if uncertain_indices:
+            samples[:, uncertain_indices] = self.sample_qubits(uncertain_indices, n)
+
+        return samples
+
+    def collapse_point(self, x, y):
+        self.collapse_by_flag(self.classical_board[x][y].qflag)
+
+    def collapse_all(self):
+        self.collapse_by_flag(None, collapse_all=True)
+
+    """
+        The idea of this function is to find out if the pieces entangled with target
+        can be placed so that target is not empty and the path is blocked at the same time.
+        This would violate double occupancy so a measurement has to be performed.
+        Only the squares of the group of target are needed, not every placement of its pieces.
+    """
+    def does_slide_violate_double_occupancy(self, source, target):
+        target_piece = self.classical_board[target.x][target.y]
+
+        if target_piece == NullPiece: 
+            #target is always empty
+            return False
+
+        entangled_squares = self.entanglement.get_squares(target_piece.qflag)
+        path = [self.qchess.get_array_index(point.x, point.y) for point in self.qchess.get_path_points(source, target)]
+
+        #if a piece is blocking the path independently of the entanglement
+        #of target, then DO is violated
+        for i in path:
+            if self.qchess.get_piece(i) != NullPiece and not i in entangled_squares:
+                return True
+
+        #the number of pieces is the number of qflags in the group of target
+        number_of_pieces = len(self.entanglement.get_group_labels(target_piece.qflag))
+
+        """
+            DO is violated if the pieces can be placed in the entangled points
+            so that at least one is blocking the path while another one is in target.
+            Any other piece can go to any of the remaining points, so that only
+            happens if target is entangled, there are at least two pieces
+            and at least one of the points of the path is entangled.
+        """
+        if number_of_pieces < 2 or not self.qchess.get_array_index(target.x, target.y) in entangled_squares:
+            return False
+
+        return any(i in entangled_squares for i in path)
+
+    """
+        A move is classical if the piece is collapsed, the path is empty and
+        the target is either empty or a collapsed piece that is captured.
+        The result is known beforehand, so there's no need to apply any gadget.
+    """
+    def is_move_classical(self, source, target, captured_points=[]):
+        piece = self.classical_board[source.x][source.y]
+        target_piece = self.classical_board[target.x][target.y]
+
+        if not piece.collapsed:
+            return False
+
+        if target_piece != NullPiece and (not target_piece.collapsed or target_piece.color == piece.color):
+            return False
+
+        for point in captured_points:
+            if not self.classical_board[point.x][point.y].collapsed:
+                return False
+
+        return self.qchess.is_path_empty(source, target)
+
+    def _classical_move(self, source, target, captured_points=[]):
+        piece = self.classical_board[source.x][source.y]
+        target_piece = self.classical_board[target.x][target.y]
+
+        self.set_empty(self.qchess.get_array_index(source.x, source.y))
+
+        #if there is a piece it's captured, so the square stays occupied
+        if target_piece == NullPiece:
+            self.set_occupied(self.qchess.get_array_index(target.x, target.y))
+
+        for point in captured_points:
+            captured_piece = self.classical_board[point.x][point.y]
+
+            if captured_piece != NullPiece:
+                self.set_empty(self.qchess.get_array_index(point.x, point.y))
+                self.set_piece(point, NullPiece)
+                self.release_qflag(captured_piece.qflag)
+
+        self.set_piece(source, NullPiece)
+        self.set_piece(target, piece.copy())
+        self.release_qflag(target_piece.qflag)
+
+    def standard_move(self, source, target, force=False):
+        #the board is consistent between moves, so unused qflags can be recycled
+        self.entanglement.recycle_labels()
+
+        piece = self.classical_board[source.x][source.y]
+
+        if not force and piece.type == PieceType.PAWN:
+            return self._standard_pawn_move(source, target)
+
+        if self.is_move_classical(source, target):
+            return self._classical_move(source, target)
+
+        target_piece = self.classical_board[target.x][target.y]
+
+        if target_piece == NullPiece or target_piece == piece:
+            if piece.is_move_slide():
+                if self.entangle_path_flags(piece.qflag, source, target):
+                    piece.collapsed = False
+
+                    #if something may be blocking then the piece might stay in place
+                    #so we don't want to remove it clasically
+                    if target_piece == NullPiece:
+                        target_piece = piece
+                
+                self.utils.perform_standard_slide(self, source, target)
+            else:
+                self.utils.perform_standard_jump(self, source, target)
+
+            self.set_piece(source, target_piece.copy())
+            self.set_piece(target, piece.copy())
+        else:
+            if target_piece.color == piece.color:
+                self.collapse_by_flag(target_piece.qflag)
+
+                if (
+                    self.classical_board[source.x][source.y] != NullPiece and
+                    self.classical_board[target.x][target.y] == NullPiece
+                ):
+                    new_source_piece = NullPiece
+
+                    if piece.is_move_slide():
+                        if self.entangle_path_flags(piece.qflag, source, target):
+                            #if something may be blocking then the piece might stay in place
+                            #so we don't want to remove it clasically
+                            piece.collapsed = False
+                            new_source_piece = piece
+                        
+                        self.utils.perform_standard_slide(self, source, target)
+                    else:
+                        self.utils.perform_standard_jump(self, source, target)
+
+                    self.set_piece(source, new_source_piece.copy())
+                    self.set_piece(target, piece.copy())
+            else:
+                self.collapse_by_flag(piece.qflag)
+
+                if self.classical_board[source.x][source.y] != NullPiece:
+                    path_empty = self.qchess.is_path_empty(source, target)
+
+                    #if the path is empty the move is just a jump
+                    if piece.is_move_slide() and not path_empty:
+                        """
+                            The capture can only fail (path blocked and target occupied)
+                            if does_slide_violate_double_occupancy returns 1, and in that
+                            case the path is collapsed whatever the result. Otherwise it
+                            always succeeds and entanglement occurs. So the result of the
+                            gadget is never needed and it doesn't have to be simulated now,
+                            only collapse_path simulates the board.
+                        """
+                        violates_double_occupancy = self.does_slide_violate_double_occupancy(source, target)
+
+                        self.utils.perform_capture_slide(self, source, target)
+
+                        if violates_double_occupancy:
+                            #we call collapse_path to update the classical board
+                            path_clear = self.collapse_path(source, target, collapse_source=True)
+
+                            if path_clear and self.classical_board[source.x][source.y] == NullPiece:
+                                self.set_piece(target, piece.copy())
+                        else:
+                            if not self.entangle_path_flags(piece.qflag, source, target):
+                                self.set_piece(source, NullPiece)
+                            else:
+                                piece.collapsed = False
+
+                            self.set_piece(target, piece.copy())
+                    else:
+                        self.utils.perform_capture_jump(self, source, target)
+
+                        self.set_piece(source, NullPiece)
+                        self.set_piece(target, piece.copy())
+
+                self.release_qflag(target_piece.qflag)
+
+    def _standard_pawn_move(self, source, target):
+        pawn = self.classical_board[source.x][source.y]
+        target_piece = self.classical_board[target.x][target.y]
+
+        move_type, ep_point = pawn.is_move_valid(source, target, qchess=self.qchess)
+        
+        #this is checked in QChess class
+        assert(move_type != Pawn.MoveType.INVALID)
+
+        captured_points = [ep_point] if move_type == Pawn.MoveType.EN_PASSANT else []
+
+        #pawns can only capture the target diagonally
+        if (
+            (move_type == Pawn.MoveType.CAPTURE) == (target_piece != NullPiece) and
+            self.is_move_classical(source, target, captured_points)
+        ):
+            return self._classical_move(source, target, captured_points)
+
+        if (
+            move_type == Pawn.MoveType.SINGLE_STEP or
+            move_type == Pawn.MoveType.DOUBLE_STEP
+        ):
+            self.collapse_by_flag(target_piece.qflag)
+
+            if (
+                self.classical_board[source.x][source.y] != NullPiece and
+                self.classical_board[target.x][target.y] == NullPiece
+            ):
+                if move_type == Pawn.MoveType.SINGLE_STEP:
+                    self.utils.perform_standard_jump(self, source, target)
+
+                    self.set_piece(source, NullPiece)
+                else:
+                    if not self.entangle_path_flags(pawn.qflag, source, target):
+                        self.set_piece(source, NullPiece)
+                    else:
+                        pawn.collapsed = False
+
+                    self.utils.perform_standard_slide(self, source, target)
+
+                self.set_piece(target, pawn.copy())
+
+        elif move_type == Pawn.MoveType.CAPTURE:
+            #pawn is the only piece that needs to collapse target when capturing
+            #because it can't move diagonally unless capturing
+            self.collapse_by_flag(pawn.qflag | target_piece.qflag)
+
+            if (
+                self.classical_board[source.x][source.y] != NullPiece and
+                self.classical_board[target.x][target.y] != NullPiece
+            ):
+                self.utils.perform_capture_jump(self, source, target)
+
+                self.set_piece(source, NullPiece)
+                self.set_piece(target, pawn.copy())
+
+                self.release_qflag(target_piece.qflag)
+
+        elif move_type == Pawn.MoveType.EN_PASSANT:
+            ep_piece = self.classical_board[ep_point.x][ep_point.y]
+
+            if target_piece == NullPiece:
+                self.utils.perform_standard_en_passant(self, source, target, ep_point)
+
+                self.set_piece(source, NullPiece)
+                self.set_piece(target, pawn)
+                self.set_piece(ep_point, NullPiece)
+
+            elif target_piece.color == pawn.color:
+                self.collapse_by_flag(target_piece.qflag)
+
+                if self.classical_board[target.x][target.y] == NullPiece:
+                    self.utils.perform_standard_en_passant(self, source, target, ep_point)
+                    
+                    self.set_piece(source, NullPiece)
+                    self.set_piece(target, pawn.copy())
+                    self.set_piece(ep_point, NullPiece)
+            else:
+                self.collapse_by_flag(pawn.qflag)
+
+                if self.classical_board[source.x][source.y] != NullPiece:
+                    self.utils.perform_capture_en_passant(self, source, target, ep_point)
+
+                    self.set_piece(source, NullPiece)
+                    self.set_piece(target, pawn.copy())
+                    self.set_piece(ep_point, NullPiece)
+
+                    self.release_qflag(target_piece.qflag)
+
+            self.release_qflag(ep_piece.qflag)
+
+    def split_move(self, source, target1, target2):
+        #the board is consistent between moves, so unused qflags can be recycled
+        self.entanglement.recycle_labels()
+
+        piece = self.classical_board[source.x][source.y]
+        target_piece1 = self.classical_board[target1.x][target1.y]
+        target_piece2 = self.classical_board[target2.x][target2.y]
+
+        #the source piece is always swapped with the target2
+        #so unless the path is blocked we know what piece target2 has
+        new_source_piece = target_piece2
+
+        if piece.is_move_slide():
+            self.utils.perform_split_slide(self, source, target1, target2)
+
+            path1_blocked = self.entangle_path_flags(piece.qflag, source, target1)
+            path2_blocked = self.entangle_path_flags(piece.qflag, source, target2)
+            
+            #set the source piece to null if any of the paths is not blocked,
+            #since the piece will always slide through that one if the other is blocked
+            if path1_blocked and path2_blocked and new_source_piece == NullPiece:
+                new_source_piece = piece
+                new_source_piece.collapsed = False
+        else:
+            self.utils.perform_split_jump(self, source, target1, target2)
+
+        if not piece.collapsed or not target_piece1.collapsed:
+            #entangle only the pieces affected by iSwap_sqrt
+            self.entangle_flags(piece.qflag, target_piece1.qflag)
+
+        if target_piece1 == NullPiece:
+            self.set_piece(target1, piece.copy())
+
+        self.set_piece(target2, piece.copy())
+        self.set_piece(source, new_source_piece.copy())
+
+        #only uncollapse the pieces if state |t1, t2> is not |00> or |11>
+        #because iSwap_sqrt leaves these states untouched
+        if target_piece1 == NullPiece:
+            self.set_piece_uncollapsed(target1)
+            self.set_piece_uncollapsed(target2)
+    
+    def merge_move(self, source1, source2, target):
+        #the board is consistent between moves, so unused qflags can be recycled
+        self.entanglement.recycle_labels()
+
+        piece1 = self.classical_board[source1.x][source1.y]
+        piece2 = self.classical_board[source2.x][source2.y]
+        target_piece = self.classical_board[target.x][target.y]
+
+        #the target piece is always swapped with the source2
+        #so unless the path is blocked we know what piece source2 has
+        new_source2_piece = target_piece
+
+        if piece1.is_move_slide():
+            self.utils.perform_merge_slide(self, source1, source2, target)
+
+            self.entangle_path_flags(piece1.qflag, source1, target)
+            path2_blocked = self.entangle_path_flags(piece2.qflag, source2, target)
+                
+            if path2_blocked and new_source2_piece == NullPiece:
+                new_source2_piece = piece1
+                new_source2_piece.collapsed = False
+        else:
+            self.utils.perform_merge_jump(self, source1, source2, target)
+   
+        if not piece1.collapsed or not piece2.collapsed:
+            #entangle only the pieces affected by iSwap_sqrt
+            self.entangle_flags(piece1.qflag, piece2.qflag)
+
+        if target_piece == NullPiece:
+            self.set_piece(target, piece1.copy())
+
+        self.set_piece(source1, piece2.copy())
+        self.set_piece(source2, new_source2_piece.copy())
+
+        if target_piece == NullPiece:
+            self.set_piece_uncollapsed(source1)
+            self.set_piece_uncollapsed(target)
+
+    def castling_move(self, king_source, rook_source, king_target, rook_target):
+        #the board is consistent between moves, so unused qflags can be recycled
+        self.entanglement.recycle_labels()
+
+        king = self.classical_board[king_source.x][king_source.y]
+        rook = self.classical_board[rook_source.x][rook_source.y]
+
+        king_target_piece = self.classical_board[king_target.x][king_target.y]
+        rook_target_piece = self.classical_board[rook_target.x][rook_target.y]
+
+        #collapse target pieces
+        self.collapse_by_flag(king_target_piece.qflag | rook_target_piece.qflag)
+
+        #if both targets are empty
+        if (
+            self.classical_board[king_target.x][king_target.y] == NullPiece and
+            self.classical_board[rook_target.x][rook_target.y] == NullPiece
+        ):
+            #the path doesn't neccesarily have to be the shortest straight path
+            #between king and rook
+            king_path = self.qchess.get_path_points(king_source, king_target)
+            rook_path = self.qchess.get_path_points(rook_source, rook_target)
+
+            # in general it's the unique combination of their paths
+            path = []
+            for point in king_path + rook_path:
+                if point == king_target or point == rook_target: continue
+
+                #we don't need to include empty squares
+                if self.classical_board[point.x][point.y] == NullPiece: continue
+
+                if not point in path:
+                    path.append(point)
+
+            #exclude king_target and rook_target just in case
+            if king_target in path: path.remove(king_target)
+            if rook_target in path: path.remove(rook_target)
+
+            #perform the quantum move        
+            self.utils.perform_castle(self, king_source, rook_source, king_target, rook_target, path)
+
+            if not path:
+                #remove from source only if path is empty
+                self.set_piece(king_source, NullPiece)
+                self.set_piece(rook_source, NullPiece)
+            else:
+                #entangle with all the pieces in the path
+                path_qflags = 0
+                for point in path:
+                    path_qflags |= self.classical_board[point.x][point.y].qflag
+                
+                self.entangle_flags(king.qflag, rook.qflag)
+                self.entangle_flags(path_qflags, king.qflag)
+
+                king.collapsed = False
+                rook.collapsed = False
+
+            self.set_piece(king_target, king.copy())
+            self.set_piece(rook_target, rook.copy())
@@ -0,0 +1,213 @@
+import heapq
+
+"""
+Keeps track of which pieces are entangled and of the squares they can be in.
+
+Every piece has a label (its qflag, a number with a single bit set). Entangled
+labels are joined in groups with union-find, and each group keeps the set
+of labels (one per piece) and the set of squares (array indices) that have
+a piece with one of those labels. All the queries take near-constant time
+or time proportional to the size of the group, never to the size of the board.
+
+Sets of labels are given as the OR of their qflags, like in the rest of the engine.
+
+Labels that are not used anymore are recycled, so the number of bits
+of the qflags stays bounded by the number of pieces in the board.
+"""
+class EntanglementIndex:
+    def __init__(self):
+        self.parents = {}
+
+        #labels and squares of each group, indexed by the root label
+        self.labels = {}
+        self.squares = {}
+
+        #label of the piece in each occupied square
+        self.square_labels = {}
+
+        self.next_label = 1
+        self.free_labels = []
+
+        #labels that might not be used anymore
+        self.released_labels = set()
+
+    """
+        Returns an unused label, the smallest one available.
+    """
+    def new_label(self):
+        self.recycle_labels()
+
+        if self.free_labels:
+            label = heapq.heappop(self.free_labels)
+        else:
+            label = self.next_label
+            self.next_label <<= 1
+
+        self.add_label(label)
+
+        return label
+
+    """
+        Marks a label as possibly unused. It's only recycled in recycle_labels,
+        since the piece might be placed in the board again before that.
+    """
+    def release_label(self, label):
+        self.released_labels.add(label)
+
+    """
+        Recycles the released labels that still have no squares.
+    """
+    def recycle_labels(self):
+        for label in self.released_labels:
+            if self.is_used(label) and not self.has_squares(label):
+                self.remove_label(label)
+
+        self.released_labels.clear()
+
+    """
+        Removes a label that has no squares from its group,
+        so that it can be used by new pieces.
+    """
+    def remove_label(self, label):
+        root = self.find(label)
+
+        labels = self.labels.pop(root)
+        squares = self.squares.pop(root)
+
+        labels.remove(label)
+        del self.parents[label]
+
+        #the label might be the parent of other labels, so a new root is chosen
+        if labels:
+            root = min(labels)
+
+            for other in labels:
+                self.parents[other] = root
+
+            self.labels[root] = labels
+            self.squares[root] = squares
+
+        heapq.heappush(self.free_labels, label)
+
+    def is_used(self, label):
+        return label in self.parents
+
+    def has_squares(self, label):
+        return any(self.square_labels[i] == label for i in self.squares[self.find(label)])
+
+    def add_label(self, label):
+        self.parents[label] = label
+        self.labels[label] = {label}
+        self.squares[label] = set()
+
+    def find(self, label):
+        root = label
+
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        #path compression
+        while self.parents[label] != root:
+            self.parents[label], label = root, self.parents[label]
+
+        return root
+
+    """
+        Yields the labels of a set of qflags.
+    """
+    def split_flags(self, qflags):
+        while qflags:
+            label = qflags & -qflags
+            qflags ^= label
+
+            yield label
+
+    """
+        Returns the roots of the groups of a set of qflags, without repetitions.
+    """
+    def get_roots(self, qflags):
+        roots = []
+
+        for label in self.split_flags(qflags):
+            if label in self.parents:
+                root = self.find(label)
+
+                if not root in roots:
+                    roots.append(root)
+
+        return roots
+
+    def union(self, label1, label2):
+        root1 = self.find(label1)
+        root2 = self.find(label2)
+
+        if root1 == root2:
+            return
+
+        #the smaller group is joined into the bigger one
+        if len(self.labels[root1]) + len(self.squares[root1]) < len(self.labels[root2]) + len(self.squares[root2]):
+            root1, root2 = root2, root1
+
+        self.parents[root2] = root1
+        self.labels[root1] |= self.labels.pop(root2)
+        self.squares[root1] |= self.squares.pop(root2)
+
+    """
+        Joins the groups of all the labels in both sets of qflags.
+    """
+    def entangle(self, qflags1, qflags2):
+        labels = list(self.split_flags(qflags1 | qflags2))
+
+        for label in labels[1:]:
+            self.union(labels[0], label)
+
+    def set_square(self, index, label):
+        previous_label = self.square_labels.pop(index, None)
+
+        if previous_label is not None:
+            self.squares[self.find(previous_label)].discard(index)
+
+        if label:
+            self.square_labels[index] = label
+            self.squares[self.find(label)].add(index)
+
+    def get_square_label(self, index):
+        return self.square_labels.get(index, 0)
+
+    def get_occupied_squares(self):
+        return self.square_labels.keys()
+
+    """
+        Returns the squares of all the groups of a set of qflags.
+    """
+    def get_squares(self, qflags):
+        squares = set()
+
+        for root in self.get_roots(qflags):
+            squares |= self.squares[root]
+
+        return squares
+
+    def get_group_labels(self, label):
+        return self.labels[self.find(label)]
+
+    """
+        Splits the groups of a set of qflags, so that every label is in its own group.
+        Returns the labels of those groups. Their squares are left empty.
+    """
+    def split_groups(self, qflags):
+        labels = []
+
+        for root in self.get_roots(qflags):
+            for index in self.squares[root]:
+                del self.square_labels[index]
+
+            group_labels = self.labels.pop(root)
+            del self.squares[root]
+
+            for label in group_labels:
+                self.add_label(label)
+
+            labels += group_labels
+
+        return labels
@@ -0,0 +1,192 @@
+import math
+
+import numpy as np
+
+"""
+Fused move gadgets shared by all the engines.
+
+Instead of computing if each path is blocked in an ancilla and then applying
+the move controlled by it gate by gate, a gadget is compiled once into a single
+unitary over all the qubits it touches, ordered as
+
+    [flags..., move qubits..., controls of the first path..., controls of the second path...]
+
+with the first one being the least significant (like qiskit). There is one control
+for every square of a path whose value isn't known and one flag for every path that has
+controls. The flags must start in |0> and end up holding if their path is blocked (1)
+or not (0), exactly like the path ancillas of the gate by gate circuits. The engines
+reset them afterwards, since that's equivalent to measuring them and forgetting the result.
+
+Gadgets are cached per move kind and value of the paths, given as a tuple with the
+number of controls of each path (0 if it's known to be clear or None if it's known to be blocked).
+"""
+
+#gadgets over more qubits than this are applied gate by gate
+MAX_FUSED_QUBITS = 8
+
+b = math.sqrt(2)
+
+iSwap = np.array([
+    [1, 0, 0, 0],
+    [0, 0, 1j, 0],
+    [0, 1j, 0, 0],
+    [0, 0, 0, 1],
+])
+
+iSwap_sqrt = np.array([
+    [1, 0, 0, 0],
+    [0, 1/b, 1j/b, 0],
+    [0, 1j/b, 1/b, 0],
+    [0, 0, 0, 1],
+])
+
+"""
+    Gates applied to the move qubits of every kind of gadget, as lists
+    of (gate, qubit1, qubit2) given the blocked value of each path.
+"""
+def _slide_gates(blocked):
+    #source, target
+    if blocked == (0,):
+        return [(iSwap, 0, 1)]
+
+    return []
+
+def _split_gates(blocked):
+    #source, target1, target2
+    if blocked == (0, 0):
+        return [(iSwap_sqrt, 1, 0), (iSwap, 0, 2)]
+
+    return _one_path_gates(blocked)
+
+def _merge_gates(blocked):
+    #target, source1, source2
+    if blocked == (0, 0):
+        return [(iSwap, 0, 2), (iSwap_sqrt, 1, 0)]
+
+    return _one_path_gates(blocked)
+
+def _one_path_gates(blocked):
+    if blocked == (0, 1):
+        return [(iSwap, 1, 0)]
+
+    if blocked == (1, 0):
+        return [(iSwap, 0, 2)]
+
+    return []
+
+def _castle_gates(blocked):
+    #king source, king target, rook source, rook target
+    if blocked == (0,):
+        return [(iSwap, 0, 1), (iSwap, 2, 3)]
+
+    return []
+
+KINDS = {
+    'slide': (2, _slide_gates),
+    'split': (3, _split_gates),
+    'merge': (3, _merge_gates),
+    'castle': (4, _castle_gates),
+}
+
+"""
+    Returns the matrix of gate applied to qubit1 and qubit2 (qubit1 being the
+    least significant one of the gate) in a register of num_qubits.
+"""
+def _expand_gate(gate, qubit1, qubit2, num_qubits):
+    size = 2**num_qubits
+    matrix = np.zeros((size, size), dtype=complex)
+
+    for column in range(size):
+        index = ((column >> qubit1) & 1) | (((column >> qubit2) & 1) << 1)
+        rest = column & ~((1 << qubit1) | (1 << qubit2))
+
+        for new_index in np.flatnonzero(gate[:, index]):
+            row = rest | ((new_index & 1) << qubit1) | (((new_index >> 1) & 1) << qubit2)
+            matrix[row, column] += gate[new_index, index]
+
+    return matrix
+
+def get_num_qubits(kind, paths):
+    num_moves, _ = KINDS[kind]
+    controls = [length for length in paths if length]
+
+    return len(controls) + num_moves + sum(controls)
+
+"""
+    Returns if all the squares of a gadget are different. A path can go through one
+    of the move squares (like splitting through one of the targets) or share squares
+    with the other path, and those gadgets have to be applied gate by gate.
+"""
+def are_squares_distinct(move_points, paths):
+    points = list(move_points)
+
+    for path in paths:
+        if path:
+            points += path
+
+    return all(not point in points[i + 1:] for i, point in enumerate(points))
+
+_gadgets = {}
+
+"""
+    Returns the fused unitary of a gadget as a NumPy matrix.
+"""
+def get_gadget(kind, paths):
+    key = (kind, tuple(paths))
+
+    if not key in _gadgets:
+        _gadgets[key] = _build_gadget(kind, paths)
+
+    return _gadgets[key]
+
+def _build_gadget(kind, paths):
+    num_moves, get_gates = KINDS[kind]
+
+    num_flags = len([length for length in paths if length])
+    num_qubits = get_num_qubits(kind, paths)
+
+    #operator applied to the move qubits for every value of the paths
+    branches = {}
+
+    size = 2**num_qubits
+    matrix = np.zeros((size, size), dtype=complex)
+
+    for column in range(size):
+        flags = column & ((1 << num_flags) - 1)
+        moves = (column >> num_flags) & ((1 << num_moves) - 1)
+        controls = column >> (num_flags + num_moves)
+
+        #value of the paths and the flags they're held in
+        blocked = []
+        flip = 0
+        flag = 0
+
+        for length in paths:
+            if length is None:
+                blocked.append(1)
+
+            elif length == 0:
+                blocked.append(0)
+
+            else:
+                blocked.append(int(controls & ((1 << length) - 1) != 0))
+                flip |= blocked[-1] << flag
+
+                controls >>= length
+                flag += 1
+
+        blocked = tuple(blocked)
+
+        if not blocked in branches:
+            branches[blocked] = np.identity(2**num_moves, dtype=complex)
+
+            for gate, qubit1, qubit2 in get_gates(blocked):
+                branches[blocked] = _expand_gate(gate, qubit1, qubit2, num_moves) @ branches[blocked]
+
+        rest = column & ~(((1 << num_moves) - 1) << num_flags)
+        rest ^= flip
+
+        for new_moves in np.flatnonzero(branches[blocked][:, moves]):
+            matrix[rest | (int(new_moves) << num_flags), column] = branches[blocked][new_moves, moves]
+
+    return matrix
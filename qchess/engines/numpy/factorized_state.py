@@ -0,0 +1,159 @@
+import numpy as np
+
+from .statevector import StateVector
+
+"""
+State of a register of qubits stored as the tensor product of
+the statevectors of its entanglement groups.
+
+Every group is a StateVector that only holds the active qubits of that group.
+All of them share the list of values, so the qubits that aren't in any group
+(the ones known to be |0> or |1>) are stored just once.
+
+A gate is applied to the group of its qubits. If they belong to different
+groups, those are merged first, which is the only time a tensor product is
+calculated. A measurement only touches the groups of the measured qubits, and
+any qubit that collapses leaves its group.
+"""
+class FactorizedState:
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+        self.values = [0] * num_qubits
+
+        #group of every active qubit
+        self.groups = {}
+
+        self.rng = np.random.default_rng()
+
+    def is_active(self, qubit):
+        return qubit in self.groups
+
+    def get_groups(self):
+        groups = []
+
+        for group in self.groups.values():
+            if not any(group is other for other in groups):
+                groups.append(group)
+
+        return groups
+
+    def _new_group(self):
+        group = StateVector(self.num_qubits)
+        group.values = self.values
+        group.rng = self.rng
+
+        return group
+
+    """
+        Returns the group that contains all the qubits, merging
+        the groups they belong to if necessary.
+    """
+    def _get_group(self, qubits):
+        groups = []
+
+        for qubit in qubits:
+            group = self.groups.get(qubit)
+
+            if group is not None and not any(group is other for other in groups):
+                groups.append(group)
+
+        if not groups:
+            return self._new_group()
+
+        group = groups[0]
+
+        for other in groups[1:]:
+            #the qubits of the other group become the most significant ones
+            group.amplitudes = np.kron(other.amplitudes, group.amplitudes)
+            group.qubits = group.qubits + other.qubits
+
+        group.positions = {qubit: i for i, qubit in enumerate(group.qubits)}
+        group.marginals = None
+
+        return group
+
+    def _update_groups(self, group, qubits):
+        for qubit in qubits:
+            if group.is_active(qubit):
+                self.groups[qubit] = group
+            else:
+                self.groups.pop(qubit, None)
+
+    def _apply(self, gate, targets, controls):
+        qubits = list(targets) + list(controls or {})
+
+        group = self._get_group(qubits)
+        previous_qubits = list(group.qubits)
+
+        getattr(group, gate)(*targets, controls=controls)
+
+        self._update_groups(group, previous_qubits + qubits)
+
+    def x(self, qubit, controls=None):
+        self._apply('x', [qubit], controls)
+
+    def iswap(self, qubit1, qubit2, controls=None):
+        self._apply('iswap', [qubit1, qubit2], controls)
+
+    def iswap_sqrt(self, qubit1, qubit2, controls=None):
+        self._apply('iswap_sqrt', [qubit1, qubit2], controls)
+
+    def unitary(self, matrix, qubits):
+        group = self._get_group(qubits)
+        previous_qubits = list(group.qubits)
+
+        group.unitary(matrix, qubits)
+
+        self._update_groups(group, previous_qubits + list(qubits))
+
+    """
+        Returns the probability of each qubit being |1>, without measuring them.
+        Every group keeps them until it changes, so only the groups
+        modified since the last call are calculated again.
+    """
+    def get_marginals(self, qubits):
+        return [
+            self.groups[qubit].get_marginals([qubit])[0] if self.is_active(qubit) else self.values[qubit]
+            for qubit in qubits
+        ]
+
+    """
+        Returns n samples of the values of the qubits as an array of shape (n, len(qubits)).
+        Since the groups aren't entangled, each one is sampled on its own.
+    """
+    def sample(self, qubits, n, rng):
+        samples = np.zeros((n, len(qubits)), dtype=int)
+
+        for j, qubit in enumerate(qubits):
+            if not self.is_active(qubit):
+                samples[:, j] = self.values[qubit]
+
+        for group in self.get_groups():
+            columns = [j for j, qubit in enumerate(qubits) if self.groups.get(qubit) is group]
+
+            if columns:
+                samples[:, columns] = group.sample([qubits[j] for j in columns], n, rng)
+
+        return samples
+
+    def reset(self, qubit):
+        if self.measure([qubit])[0] == 1:
+            self.x(qubit)
+
+    """
+        Measures the qubits and returns their values in the same order.
+        Since the groups aren't entangled, each one is measured on its own.
+    """
+    def measure(self, qubits):
+        for group in self.get_groups():
+            group_qubits = [qubit for qubit in qubits if self.groups.get(qubit) is group]
+
+            if group_qubits:
+                previous_qubits = list(group.qubits)
+
+                group.rng = self.rng
+                group.measure(group_qubits)
+
+                self._update_groups(group, previous_qubits)
+
+        return [self.values[qubit] for qubit in qubits]
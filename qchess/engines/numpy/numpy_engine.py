@@ -0,0 +1,58 @@
+import numpy as np
+
+from . import nutils
+from .factorized_state import FactorizedState
+
+from qchess.piece import *
+
+from qchess.engines.board_engine import BoardEngine
+
+"""
+Engine that simulates the board directly with a NumPy statevector,
+without building or executing any circuit.
+"""
+class NumpyEngine(BoardEngine):
+    utils = nutils
+    state_class = FactorizedState
+
+    #if true, the moves that depend on paths are applied as a single unitary
+    #(see engines/gadgets.py), which needs state_class to implement unitary()
+    fuse_gadgets = True
+
+    def __init__(self, qchess, width, height):
+        #ancilla qubits used for some intermediate operations
+        #(placed after the qubits of the board)
+        self.aregister = [width * height + i for i in range(3)]
+
+        #used by the state to pick the outcome of the measurements
+        #(kept here since the state is replaced every time it's reset)
+        self.rng = np.random.default_rng(qchess.seed)
+
+        super().__init__(qchess, width, height)
+
+    def reset_state(self):
+        self.state = self.state_class(self.width * self.height + len(self.aregister))
+        self.state.rng = self.rng
+
+        #populate the qubits if pieces already exist
+        for i in range(self.width * self.height):
+            if self.qchess.get_piece(i) != NullPiece:
+                self.state.x(i)
+
+    def set_occupied(self, i):
+        self.state.x(i)
+
+    def set_empty(self, i):
+        self.state.x(i)
+
+    def measure_qubits(self, indices):
+        return self.state.measure(indices)
+
+    def get_qubit_probabilities(self, indices):
+        return self.state.get_marginals(indices)
+
+    def sample_qubits(self, indices, n):
+        return self.state.sample(indices, n, self.sample_rng)
+
+    def get_qubit(self, x, y):
+        return self.qchess.get_array_index(x, y)
@@ -0,0 +1,326 @@
+"""
+    Move gadgets of NumpyEngine.
+
+    They perform the same operations as the circuits in qutils, but are applied
+    directly to the engine statevector. Instead of surrounding every multi-controlled
+    gate with X gates, controls are given with the value they must have.
+"""
+
+from qchess.engines import gadgets
+
+"""
+    Sets ancilla to |1> if any of the points is occupied and to |0> otherwise.
+    Only the points whose value is unknown are used as controls.
+"""
+def _set_path_ancilla(engine, points, ancilla):
+    points = engine.get_uncertain_points(points)
+
+    engine.state.reset(ancilla)
+
+    #always clear
+    if points == []:
+        return
+
+    engine.state.x(ancilla)
+
+    #always blocked
+    if points is None:
+        return
+
+    controls = {}
+
+    for point in points:
+        controls[engine.get_qubit(point.x, point.y)] = 0
+
+    engine.state.x(ancilla, controls=controls)
+
+"""
+    Applies the fused gadget of kind (see engines/gadgets.py) to the squares of
+    move_points, controlled by the paths given by BoardEngine.get_uncertain_points.
+    The flags are held in the ancillas.
+
+    Returns false (and does nothing) if the state can't apply fused gadgets,
+    the gadget is too big to be fused or its squares aren't all different.
+"""
+def _apply_fused_gadget(engine, kind, move_points, paths):
+    key = tuple(None if path is None else len(path) for path in paths)
+
+    if not engine.fuse_gadgets or gadgets.get_num_qubits(kind, key) > gadgets.MAX_FUSED_QUBITS:
+        return False
+
+    if not gadgets.are_squares_distinct(move_points, paths):
+        return False
+
+    flags = engine.aregister[:len([path for path in paths if path])]
+
+    for flag in flags:
+        engine.state.reset(flag)
+
+    qubits = flags + [engine.get_qubit(point.x, point.y) for point in move_points]
+
+    for path in paths:
+        if path:
+            qubits += [engine.get_qubit(point.x, point.y) for point in path]
+
+    engine.state.unitary(gadgets.get_gadget(kind, key), qubits)
+
+    return True
+
+def perform_standard_jump(engine, source, target):
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+
+    engine.state.iswap(qsource, qtarget)
+
+def perform_capture_jump(engine, source, target):
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+
+    #this ancilla qubit is going to hold the captured piece
+    captured_piece = engine.aregister[0]
+    engine.state.reset(captured_piece)
+
+    engine.state.iswap(qtarget, captured_piece)
+    engine.state.iswap(qsource, qtarget)
+
+def perform_split_jump(engine, source, target1, target2):
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget1 = engine.get_qubit(target1.x, target1.y)
+    qtarget2 = engine.get_qubit(target2.x, target2.y)
+
+    engine.state.iswap_sqrt(qtarget1, qsource)
+    engine.state.iswap(qsource, qtarget2)
+
+def perform_merge_jump(engine, source1, source2, target):
+    qsource1 = engine.get_qubit(source1.x, source1.y)
+    qsource2 = engine.get_qubit(source2.x, source2.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+
+    engine.state.iswap(qtarget, qsource2)
+    engine.state.iswap_sqrt(qsource1, qtarget)
+
+def perform_standard_slide(engine, source, target):
+    path = engine.get_uncertain_points(engine.qchess.get_path_points(source, target))
+
+    #the path is always blocked
+    if path is None:
+        return
+
+    #the path is always clear
+    if not path:
+        perform_standard_jump(engine, source, target)
+        return
+
+    if _apply_fused_gadget(engine, 'slide', [source, target], [path]):
+        return
+
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+
+    #holds if the path is blocked or not
+    path_ancilla = engine.aregister[0]
+    _set_path_ancilla(engine, path, path_ancilla)
+
+    engine.state.iswap(qsource, qtarget, controls={path_ancilla: 0})
+
+"""
+    *The source piece has already been collapsed before this is called*
+
+    Same conditions as qutils.perform_capture_slide.
+"""
+def perform_capture_slide(engine, source, target):
+    path = engine.get_uncertain_points(engine.qchess.get_path_points(source, target))
+
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+
+    #the path is always clear
+    if path == []:
+        perform_capture_jump(engine, source, target)
+        return
+
+    #the path is always blocked, so the piece doesn't move
+    if path is None:
+        return
+
+    #holds if the path is blocked or not
+    path_ancilla = engine.aregister[0]
+    _set_path_ancilla(engine, path, path_ancilla)
+
+    #holds the final condition that's going to be measured
+    cond_ancilla = engine.aregister[1]
+    engine.state.reset(cond_ancilla)
+
+    #holds the captured piece
+    captured_piece = engine.aregister[2]
+    engine.state.reset(captured_piece)
+
+    #path is not blocked
+    engine.state.x(cond_ancilla, controls={path_ancilla: 0})
+
+    #blocked but target empty
+    engine.state.x(cond_ancilla, controls={qtarget: 0, path_ancilla: 1})
+
+    cond_value = engine.state.measure([cond_ancilla])[0]
+
+    if cond_value == 1:
+        engine.state.iswap(qtarget, captured_piece, controls={path_ancilla: 0})
+        engine.state.iswap(qsource, qtarget, controls={path_ancilla: 0})
+
+"""
+    The args (single, double1, double2) are
+        split: (source, target1, target2)
+        merge: (target, source1, source2)
+"""
+def _slide_split_merge(engine, single, double1, double2, is_split):
+    qsingle = engine.get_qubit(single.x, single.y)
+    qdouble1 = engine.get_qubit(double1.x, double1.y)
+    qdouble2 = engine.get_qubit(double2.x, double2.y)
+
+    path1 = engine.get_uncertain_points(engine.qchess.get_path_points(single, double1))
+    path2 = engine.get_uncertain_points(engine.qchess.get_path_points(single, double2))
+
+    kind = 'split' if is_split else 'merge'
+
+    if (path1 or path2) and _apply_fused_gadget(engine, kind, [single, double1, double2], [path1, path2]):
+        return
+
+    #if both paths are known only one of the operations is performed
+    if not path1 and not path2:
+        if path1 == [] and path2 == []:
+            if is_split:
+                engine.state.iswap_sqrt(qdouble1, qsingle)
+                engine.state.iswap(qsingle, qdouble2)
+            else:
+                engine.state.iswap(qsingle, qdouble2)
+                engine.state.iswap_sqrt(qdouble1, qsingle)
+
+        elif path1 == []:
+            engine.state.iswap(qdouble1, qsingle)
+
+        elif path2 == []:
+            engine.state.iswap(qsingle, qdouble2)
+
+        return
+
+    #holds if the first path is blocked or not
+    path_ancilla1 = engine.aregister[0]
+    _set_path_ancilla(engine, engine.qchess.get_path_points(single, double1), path_ancilla1)
+
+    #holds if the second path is blocked or not
+    path_ancilla2 = engine.aregister[1]
+    _set_path_ancilla(engine, engine.qchess.get_path_points(single, double2), path_ancilla2)
+
+    #holds the control for jump and slide
+    control_ancilla = engine.aregister[2]
+    engine.state.reset(control_ancilla)
+    engine.state.x(control_ancilla)
+
+    #perform the split/merge if both paths are clear
+    engine.state.x(control_ancilla, controls={path_ancilla1: 0, path_ancilla2: 0})
+
+    if is_split:
+        engine.state.iswap_sqrt(qdouble1, qsingle, controls={control_ancilla: 0})
+        engine.state.iswap(qsingle, qdouble2, controls={control_ancilla: 0})
+    else:
+        engine.state.iswap(qsingle, qdouble2, controls={control_ancilla: 0})
+        engine.state.iswap_sqrt(qdouble1, qsingle, controls={control_ancilla: 0})
+
+    #reset the control
+    engine.state.reset(control_ancilla)
+    engine.state.x(control_ancilla)
+
+    #perform one jump if only the first path is clear
+    engine.state.x(control_ancilla, controls={path_ancilla1: 0, path_ancilla2: 1})
+    engine.state.iswap(qdouble1, qsingle, controls={control_ancilla: 0})
+
+    #reset the control
+    engine.state.reset(control_ancilla)
+    engine.state.x(control_ancilla)
+
+    #perform the other jump if only the second path is clear
+    engine.state.x(control_ancilla, controls={path_ancilla1: 1, path_ancilla2: 0})
+    engine.state.iswap(qsingle, qdouble2, controls={control_ancilla: 0})
+
+def perform_split_slide(engine, source, target1, target2):
+    _slide_split_merge(engine, source, target1, target2, is_split=True)
+
+def perform_merge_slide(engine, source1, source2, target):
+    _slide_split_merge(engine, target, source1, source2, is_split=False)
+
+def perform_standard_en_passant(engine, source, target, ep_target):
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+    qep_target = engine.get_qubit(ep_target.x, ep_target.y)
+
+    captured_ancilla = engine.aregister[0]
+    engine.state.reset(captured_ancilla)
+
+    #holds if both source and ep_target are empty or not at the same time
+    both_pieces_ancilla = engine.aregister[1]
+    engine.state.reset(both_pieces_ancilla)
+
+    engine.state.x(both_pieces_ancilla, controls={qsource: 1, qep_target: 1})
+    engine.state.x(both_pieces_ancilla)
+
+    engine.state.iswap(qep_target, captured_ancilla, controls={both_pieces_ancilla: 0})
+    engine.state.iswap(qsource, qtarget, controls={both_pieces_ancilla: 0})
+
+def perform_capture_en_passant(engine, source, target, ep_target):
+    qsource = engine.get_qubit(source.x, source.y)
+    qtarget = engine.get_qubit(target.x, target.y)
+    qep_target = engine.get_qubit(ep_target.x, ep_target.y)
+
+    #since this move can capture two pieces at the same time,
+    #we need two ancillas to hold them
+    captured_ancilla1 = engine.aregister[0]
+    engine.state.reset(captured_ancilla1)
+
+    captured_ancilla2 = engine.aregister[1]
+    engine.state.reset(captured_ancilla2)
+
+    #holds if any of target, ep_target exist
+    #(see qutils.perform_capture_en_passant)
+    any_piece_ancilla = engine.aregister[2]
+    engine.state.reset(any_piece_ancilla)
+
+    engine.state.x(any_piece_ancilla, controls={qep_target: 1})
+    engine.state.x(any_piece_ancilla, controls={qtarget: 1})
+
+    engine.state.x(any_piece_ancilla)
+
+    engine.state.iswap(qep_target, captured_ancilla1, controls={any_piece_ancilla: 0})
+    engine.state.iswap(qtarget, captured_ancilla2, controls={any_piece_ancilla: 0})
+    engine.state.iswap(qsource, qtarget, controls={any_piece_ancilla: 0})
+
+#path holds all points that must be empty for the move to be valid (excluding targets)
+def perform_castle(engine, king_source, rook_source, king_target, rook_target, path=None):
+    qking_source = engine.get_qubit(king_source.x, king_source.y)
+    qrook_source = engine.get_qubit(rook_source.x, rook_source.y)
+    qking_target = engine.get_qubit(king_target.x, king_target.y)
+    qrook_target = engine.get_qubit(rook_target.x, rook_target.y)
+
+    if path:
+        path = engine.get_uncertain_points(path)
+
+        #the path is always blocked
+        if path is None:
+            return
+
+    if path and _apply_fused_gadget(
+        engine, 'castle', [king_source, king_target, rook_source, rook_target], [path]
+    ):
+        return
+
+    if path:
+        #holds if the path is blocked or not
+        path_ancilla = engine.aregister[0]
+        _set_path_ancilla(engine, path, path_ancilla)
+
+        #perform the movement
+        engine.state.iswap(qking_source, qking_target, controls={path_ancilla: 0})
+        engine.state.iswap(qrook_source, qrook_target, controls={path_ancilla: 0})
+    else:
+        #perform the movement
+        engine.state.iswap(qking_source, qking_target)
+        engine.state.iswap(qrook_source, qrook_target)
@@ -0,0 +1,283 @@
+import math
+
+import numpy as np
+
+#qubits with a smaller probability of being |0> or |1> are considered collapsed
+PROBABILITY_EPSILON = 1e-10
+
+"""
+    Measures the qubits stored in the given positions of amplitudes (the ith least significant
+    bit of the index being position i), collapsing the amplitudes in place.
+"""
+def measure_amplitudes(amplitudes, positions, rng):
+    indices = np.arange(len(amplitudes))
+
+    #index of the outcome of every state
+    outcomes = np.zeros(len(amplitudes), dtype=int)
+    for i, position in enumerate(positions):
+        outcomes |= ((indices >> position) & 1) << i
+
+    probabilities = np.bincount(
+        outcomes, weights=np.abs(amplitudes)**2,
+        minlength=2**len(positions)
+    )
+
+    outcome = rng.choice(len(probabilities), p=probabilities / probabilities.sum())
+
+    amplitudes[outcomes != outcome] = 0
+    amplitudes /= np.linalg.norm(amplitudes)
+
+"""
+    Removes the qubits that are |0> or |1> from amplitudes, a statevector of num_qubits.
+    Returns the amplitudes of the rest of the qubits and the value of every qubit
+    (None if it's still in a superposition).
+"""
+def remove_collapsed(amplitudes, num_qubits):
+    probabilities = np.abs(amplitudes)**2
+    indices = np.arange(len(amplitudes))
+
+    #numpy axis 0 is the most significant qubit
+    tensor = amplitudes.reshape([2] * num_qubits)
+    tensor_index = [slice(None)] * num_qubits
+
+    values = []
+
+    for i in range(num_qubits):
+        probability = probabilities[(indices >> i) & 1 == 1].sum()
+
+        if probability < PROBABILITY_EPSILON:
+            values.append(0)
+            tensor_index[num_qubits - i - 1] = 0
+
+        elif probability > 1 - PROBABILITY_EPSILON:
+            values.append(1)
+            tensor_index[num_qubits - i - 1] = 1
+
+        else:
+            values.append(None)
+
+    amplitudes = tensor[tuple(tensor_index)].reshape(-1)
+
+    return amplitudes / np.linalg.norm(amplitudes), values
+
+"""
+Statevector of a register of qubits, stored as a NumPy array.
+
+Only the qubits that can be in a superposition (active qubits) are stored in
+the array, the value of the rest is known to be |0> or |1> and is kept apart.
+A qubit is activated the first time a gate might leave it in a superposition
+and deactivated when it's measured or collapses as a result of a measurement.
+
+All gates are applied with vectorized index arithmetic over the array.
+Controls are given as a dict {qubit: value}, so the gate is only applied
+to the states in which every control qubit has that value.
+"""
+class StateVector:
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+
+        #values of the qubits that are not active
+        self.values = [0] * num_qubits
+
+        #qubits[i] is the qubit stored in the ith least significant bit of the array index
+        self.qubits = []
+        self.positions = {}
+
+        self.amplitudes = np.ones(1, dtype=complex)
+
+        #probability of every active qubit being |1>, calculated when needed
+        self.marginals = None
+
+        self.rng = np.random.default_rng()
+
+    def is_active(self, qubit):
+        return qubit in self.positions
+
+    def _activate(self, qubit):
+        if self.is_active(qubit):
+            return
+
+        size = len(self.amplitudes)
+        amplitudes = np.zeros(2 * size, dtype=complex)
+
+        #the new qubit is the most significant one
+        offset = size * self.values[qubit]
+        amplitudes[offset:offset + size] = self.amplitudes
+
+        self.positions[qubit] = len(self.qubits)
+        self.qubits.append(qubit)
+        self.amplitudes = amplitudes
+        self.marginals = None
+
+    """
+        Returns the mask and value that the array indices must match for the
+        controls to be satisfied, or None if they can never be satisfied.
+    """
+    def _controls_mask(self, controls):
+        mask = 0
+        value = 0
+
+        if controls:
+            for qubit, control_value in controls.items():
+                if self.is_active(qubit):
+                    mask |= 1 << self.positions[qubit]
+                    value |= control_value << self.positions[qubit]
+
+                elif self.values[qubit] != control_value:
+                    return None
+
+        return mask, value
+
+    def x(self, qubit, controls=None):
+        controls_mask = self._controls_mask(controls)
+
+        if controls_mask is None:
+            return
+
+        mask, value = controls_mask
+
+        if not mask and not self.is_active(qubit):
+            self.values[qubit] ^= 1
+            return
+
+        self._activate(qubit)
+        self.marginals = None
+
+        indices = np.arange(len(self.amplitudes))
+        indices = indices[(indices & mask) == value]
+
+        self.amplitudes[indices] = self.amplitudes[indices ^ (1 << self.positions[qubit])]
+
+    def iswap(self, qubit1, qubit2, controls=None):
+        self._apply_iswap(qubit1, qubit2, controls, is_sqrt=False)
+
+    def iswap_sqrt(self, qubit1, qubit2, controls=None):
+        self._apply_iswap(qubit1, qubit2, controls, is_sqrt=True)
+
+    def _apply_iswap(self, qubit1, qubit2, controls, is_sqrt):
+        controls_mask = self._controls_mask(controls)
+
+        if controls_mask is None:
+            return
+
+        mask, value = controls_mask
+
+        if not mask and not self.is_active(qubit1) and not self.is_active(qubit2):
+            #|00> and |11> are left untouched
+            if self.values[qubit1] == self.values[qubit2]:
+                return
+
+            #iSwap just swaps the values (up to a global phase)
+            if not is_sqrt:
+                self.values[qubit1], self.values[qubit2] = self.values[qubit2], self.values[qubit1]
+                return
+
+        self._activate(qubit1)
+        self._activate(qubit2)
+        self.marginals = None
+
+        bit1 = 1 << self.positions[qubit1]
+        bit2 = 1 << self.positions[qubit2]
+
+        #indices of the states |10> and |01> of both qubits
+        indices = np.arange(len(self.amplitudes))
+        indices10 = indices[(indices & (mask | bit1 | bit2)) == (value | bit1)]
+        indices01 = indices10 ^ (bit1 | bit2)
+
+        amplitudes10 = self.amplitudes[indices10]
+        amplitudes01 = self.amplitudes[indices01]
+
+        if is_sqrt:
+            self.amplitudes[indices10] = (amplitudes10 + 1j * amplitudes01) / math.sqrt(2)
+            self.amplitudes[indices01] = (1j * amplitudes10 + amplitudes01) / math.sqrt(2)
+        else:
+            self.amplitudes[indices10] = 1j * amplitudes01
+            self.amplitudes[indices01] = 1j * amplitudes10
+
+    """
+        Applies a unitary given as a NumPy matrix to the qubits
+        (the first one being the least significant of the matrix).
+    """
+    def unitary(self, matrix, qubits):
+        for qubit in qubits:
+            self._activate(qubit)
+
+        self.marginals = None
+
+        bits = [1 << self.positions[qubit] for qubit in qubits]
+        mask = sum(bits)
+
+        #array index of every basis state of the qubits, for every value of the rest
+        local_indices = np.zeros(len(matrix), dtype=int)
+        for i, bit in enumerate(bits):
+            local_indices |= ((np.arange(len(matrix)) >> i) & 1) * bit
+
+        indices = np.arange(len(self.amplitudes))
+        indices = indices[(indices & mask) == 0][:, None] | local_indices
+
+        self.amplitudes[indices] = self.amplitudes[indices] @ matrix.T
+
+    """
+        Returns the probability of each qubit being |1>, without measuring them.
+    """
+    def get_marginals(self, qubits):
+        if self.marginals is None:
+            probabilities = np.abs(self.amplitudes)**2
+            indices = np.arange(len(self.amplitudes))
+
+            self.marginals = [probabilities[(indices >> i) & 1 == 1].sum() for i in range(len(self.qubits))]
+
+        return [
+            self.marginals[self.positions[qubit]] if self.is_active(qubit) else self.values[qubit]
+            for qubit in qubits
+        ]
+
+    """
+        Returns n samples of the values of the qubits as an array of shape (n, len(qubits)),
+        drawn from the same distribution as measure (with rng) but without changing the state.
+    """
+    def sample(self, qubits, n, rng):
+        probabilities = np.abs(self.amplitudes)**2
+        states = rng.choice(len(probabilities), size=n, p=probabilities / probabilities.sum())
+
+        samples = np.zeros((n, len(qubits)), dtype=int)
+
+        for j, qubit in enumerate(qubits):
+            if self.is_active(qubit):
+                samples[:, j] = (states >> self.positions[qubit]) & 1
+            else:
+                samples[:, j] = self.values[qubit]
+
+        return samples
+
+    def reset(self, qubit):
+        if self.measure([qubit])[0] == 1:
+            self.x(qubit)
+
+    """
+        Measures the qubits and returns their values in the same order.
+        The state collapses and all the qubits left in |0> or |1> are deactivated.
+    """
+    def measure(self, qubits):
+        active_qubits = [qubit for qubit in qubits if self.is_active(qubit)]
+
+        if active_qubits:
+            measure_amplitudes(self.amplitudes, [self.positions[qubit] for qubit in active_qubits], self.rng)
+            self._deactivate_collapsed()
+
+        return [self.values[qubit] for qubit in qubits]
+
+    def _deactivate_collapsed(self):
+        self.amplitudes, values = remove_collapsed(self.amplitudes, len(self.qubits))
+
+        active_qubits = []
+
+        for qubit, value in zip(self.qubits, values):
+            if value is None:
+                active_qubits.append(qubit)
+            else:
+                self.values[qubit] = value
+
+        self.qubits = active_qubits
+        self.positions = {qubit: i for i, qubit in enumerate(active_qubits)}
+        self.marginals = None
@@ -1,23 +1,28 @@
-import itertools
+import copy
 
+import numpy as np
 from qiskit import *
 from . import qutils
 
-from qchess.point import Point
 from qchess.piece import *
-from qchess.pawn import Pawn
 
-from qchess.engines.base_engine import BaseEngine
+from qchess.engines.board_engine import BoardEngine
+from qchess.engines.numpy.statevector import measure_amplitudes, remove_collapsed
 
-class QiskitEngine(BaseEngine):
-    def __init__(self, qchess, width, height):
-        self.qchess = qchess
-        self.classical_board = qchess.board
-        self.width = width
-        self.height = height
+class QiskitEngine(BoardEngine):
+    utils = qutils
 
-        NullPiece.qflag = 0
-        self.qflag_index = 0
+    def __init__(self, qchess, width, height, incremental=True):
+        #if true, the quantum state is kept after every simulation
+        #so the next one only has to simulate the gates added since then
+        self.incremental = incremental
+
+        #used to measure the stored state (see measure_statevector)
+        #and to seed the simulator, so the game is reproducible if qchess has a seed
+        self.rng = np.random.default_rng(qchess.seed)
+
+        #number of instructions sent to the simulator (see run_circuit)
+        self.simulated_instructions = 0
 
         if width * height > qutils.MAX_QUBIT_MEMORY:
             print()
@@ -26,17 +31,18 @@ class QiskitEngine(BaseEngine):
             print('You can still play the game, but the program might crash if the system becomes too entangled')
             print()
 
+        super().__init__(qchess, width, height)
+
+    def reset_state(self):
         self.generate_circuit()
 
     def generate_circuit(self):
         #board main quantum register
         self.qregister = QuantumRegister(self.width * self.height)
-        
-        #ancilla qubits used for some intermediate operations
-        self.aregister = QuantumRegister(3)
 
-        #ancilla qubits used by the mct function in qutils
-        self.mct_register = QuantumRegister(6)
+        #ancilla qubits, only created if a move needs them and no square can be used instead
+        #(see get_scratch_qubits)
+        self.aregister = []
         
         #classical bits to collapse each square individually
         self.cregister = ClassicalRegister(self.width * self.height)
@@ -44,542 +50,420 @@ class QiskitEngine(BaseEngine):
         #classical bit for other operations
         self.cbit_misc = ClassicalRegister(1)
 
-        self.qcircuit = QuantumCircuit(self.qregister, self.aregister, self.mct_register, self.cregister, self.cbit_misc)
+        #classical bits for the moves that depend on two conditions
+        self.cbit_paths = ClassicalRegister(2)
+
+        self.qcircuit = self.new_circuit()
+
+        #circuit whose instructions have been translated by get_native_data
+        self.native_circuit = None
+
+        #qubit only used by the simulation to write known bits (see execute)
+        self.bit_writer = QuantumRegister(1)[0]
+
+        #state of the qubits that are not |0> or |1> after the last simulation
+        #(only used in incremental mode)
+        #live_qubits[i] is the ith least significant qubit of statevector
+        self.live_qubits = []
+        self.statevector = np.ones(1, dtype=complex)
+
+        #value of every other qubit (0 if not present)
+        self.qubit_values = {}
+
+        #probability of every live qubit being |1>, and the statevector they were calculated from
+        self.marginals = {}
+        self.marginals_statevector = None
+
+        #size of qcircuit after the last compaction (only used in non-incremental mode)
+        self.compacted_circuit_size = None
 
         #populate the qubits if pieces already exist
         for i in range(self.width * self.height):
             if self.qchess.get_piece(i) != NullPiece:
-                self.qcircuit.x(self.qregister[i])
-
-    def on_add_piece(self, x, y, piece):
-        piece.qflag = 1 << self.qflag_index
-        self.qflag_index += 1
+                self.set_occupied(i)
 
-        #the value is already |0> (no piece)
-        #since we want to add the piece with 100% probability, we swap to |1>
-        q1 = self.get_qubit(x, y)
-        self.qcircuit.x(q1)
+    """
+        Simulates qcircuit with one shot and returns the value of each classical bit.
 
-    def on_pawn_promotion(self, promoted_pawn, pawn):
-        promoted_pawn.qflag = pawn.qflag
+        In incremental mode the state is kept between calls, so only the gates added
+        since the last call are simulated. Gates acting on qubits known to be |0> or |1>
+        are computed classically and the rest are simulated starting from the stored state.
+        Afterwards qcircuit is emptied and the qubits left in |0> or |1> are
+        removed from the stored state.
+    """
+    def execute(self, compact=False):
+        if not self.incremental:
+            #the final state is only needed if the circuit is compacted afterwards
+            compact = compact or len(self.qcircuit.data) > qutils.COMPACTION_SIZE
 
-    def get_qubit(self, x, y):
-        return self.qregister[self.qchess.get_array_index(x, y)]
+            #the whole circuit is simulated every time, so the gates
+            #that don't affect any measurement can be left out
+            circuit = QuantumCircuit(*self.qcircuit.qregs, *self.qcircuit.cregs)
 
-    def get_bit(self, x, y):
-        return self.cregister[self.qchess.get_array_index(x, y)]
+            for instruction, qargs, cargs in qutils.optimize_instructions(self.get_native_data(), measured_only=not compact):
+                circuit.append(instruction, qargs, cargs)
 
-    def get_all_entangled_points(self, x, y):
-        points = []
-        qflag = self.classical_board[x][y].qflag
+            if not compact:
+                result = self.run_circuit(circuit, qutils.backend)
+                return qutils.get_result_bits(result, circuit)
 
-        if qflag != 0:
-            for i in range(self.width):
-                for j in range(self.height):
-                    if self.classical_board[i][j].qflag & qflag != 0:
-                        points.append(Point(i, j))
-        
-        return points
+            result = self.run_circuit(circuit, qutils.statevector_backend)
+            self.compact_circuit(circuit.qubits, result.get_statevector(circuit))
 
-    def entangle_flags(self, qflag1, qflag2):
-        #nullpiece
-        if not qflag1 or not qflag2:
-            return
+            return qutils.get_result_bits(result, circuit)
 
-        #already entangled
-        if qflag1 & qflag2 != 0:
-            return
+        qubits = list(self.live_qubits)
+        qubit_index = {qubit: i for i, qubit in enumerate(qubits)}
 
-        for i in range(self.width * self.height):
-            piece = self.qchess.get_piece(i)
+        #values of the qubits when they start being simulated
+        initial_values = {}
 
-            if piece.qflag & qflag1 != 0:
-                piece.qflag |= qflag2
+        #bits measured classically
+        bits = {}
 
-            elif piece.qflag & qflag2 != 0:
-                piece.qflag |= qflag1
+        simulated_instructions = []
 
-    def entangle_path_flags(self, qflag, source, target):
-        all_qflags = 0
+        for instruction, qargs, cargs in self.qcircuit.data:
+            if instruction.name == 'barrier':
+                continue
 
-        pieces = self.qchess.get_path_pieces(source, target)
+            if instruction.condition:
+                register, value = instruction.condition
 
-        for piece in pieces:
-            all_qflags |= piece.qflag
-        
-        self.entangle_flags(all_qflags, qflag)
+                if all(bit in bits for bit in register):
+                    register_value = sum(bits[bit] << i for i, bit in enumerate(register))
 
-        return bool(pieces)
+                    if register_value != value:
+                        continue
 
-    def collapse_by_flag(self, qflag, collapse_all=False):
-        #nullpiece
-        if not qflag and not collapse_all:
-            return
+                    #the condition has been resolved classically
+                    instruction = instruction.copy()
+                    instruction.condition = None
 
-        collapsed_indices = []
+                else:
+                    #the bits of the register measured classically are written
+                    #to the simulated circuit, since the condition depends on them
+                    for bit in register:
+                        if bit in bits:
+                            if not self.bit_writer in qubit_index:
+                                qubit_index[self.bit_writer] = len(qubits)
+                                qubits.append(self.bit_writer)
+                                initial_values[self.bit_writer] = 0
 
-        for i in range(self.width * self.height):
-            piece = self.qchess.get_piece(i)
+                            simulated_instructions += qutils.get_bit_write(self.bit_writer, bit, bits.pop(bit))
 
             if (
-                not piece.collapsed and
-                piece != NullPiece and (collapse_all or piece.qflag & qflag != 0)
+                not instruction.condition and
+                not any(qubit in qubit_index for qubit in qargs) and
+                qutils.apply_classically(instruction, qargs, cargs, self.qubit_values, bits)
             ):
-                #measure the ith qubit to the ith bit
-                self.qcircuit.measure(self.qregister[i], self.cregister[i])
-                collapsed_indices.append(i)
-        
-        if collapsed_indices:
-            job = execute(self.qcircuit, backend=qutils.backend, shots=1)
-            result = job.result()
+                continue
 
-            bitstring = list(result.get_counts().keys())[0].split(' ')[1]
+            for qubit in qargs:
+                if not qubit in qubit_index:
+                    qubit_index[qubit] = len(qubits)
+                    qubits.append(qubit)
+                    initial_values[qubit] = self.qubit_values.get(qubit, 0)
 
-            for i, char in enumerate(bitstring[::-1]):
-                pos = self.qchess.get_board_point(i)
+            for bit in cargs:
+                bits.pop(bit, None)
 
-                if char == '0' and i in collapsed_indices:
-                    self.classical_board[pos.x][pos.y] = NullPiece
+            simulated_instructions.append((instruction, qargs, cargs))
 
-                    #set to |0> in circuit
-                    self.qcircuit.reset(self.qregister[i])
+        self.qcircuit = self.new_circuit()
 
-                if char == '1' and i in collapsed_indices:
-                    #set to |1> in circuit
-                    self.qcircuit.reset(self.qregister[i])
-                    self.qcircuit.x(self.qregister[i])
+        if not simulated_instructions:
+            return bits
 
-                    piece = self.qchess.get_piece(i)
-                    assert(piece != NullPiece)
-                    piece.collapsed = True
+        register = QuantumRegister(len(qubits))
+        circuit = QuantumCircuit(register, self.cregister, self.cbit_misc, self.cbit_paths)
 
-                    #since we can't be 100% sure of the original qflag of a piece
-                    #we assign them at random from the qflag used to collapse
-                    #(note: binary qflag has as many '1's as the number of collapsed pieces)
+        if self.live_qubits:
+            #the new qubits are more significant than the live ones
+            offset = 0
+            for i in range(len(self.live_qubits), len(qubits)):
+                offset |= initial_values[qubits[i]] << i
 
-                    if not collapse_all:
-                        #find the position of the first '1' in binary qflag
-                        binary_qflag = bin(qflag)[2:]
-                        index = len(binary_qflag) - binary_qflag.find('1') - 1
+            initial_statevector = np.zeros(2**len(qubits), dtype=complex)
+            initial_statevector[offset:offset + len(self.statevector)] = self.statevector
 
-                        #there should always be enough '1's for every collapsed piece
-                        assert(index < len(bin(qflag)))
+            #the simulators can't be given an initial state, so it's prepared by the circuit
+            circuit.initialize(initial_statevector, register)
+        else:
+            #cheaper than sending the whole initial state to the simulator
+            for qubit, value in initial_values.items():
+                if value == 1:
+                    circuit.x(register[qubit_index[qubit]])
+
+        for instruction, qargs, cargs in qutils.optimize_instructions(simulated_instructions):
+            for native_instruction, native_qargs, native_cargs in qutils.get_native_instructions(
+                instruction, [register[qubit_index[qubit]] for qubit in qargs], cargs, qutils.statevector_backend
+            ):
+                circuit.append(native_instruction, native_qargs, native_cargs)
 
-                        #generate a new qflag with all '0's except a '1' in that position
-                        new_qflag = 1 << index
+        result = self.run_circuit(circuit, qutils.statevector_backend)
 
-                        #remove the '1' in that position from binary qflag
-                        qflag ^= new_qflag
+        self.store_statevector(qubits, result.get_statevector(circuit))
 
-                        #assign new original qflag
-                        piece.qflag = new_qflag 
-                    
-        #assign new qflags to all the pieces
-        if collapse_all:
-            self.qflag_index = 0
+        #bits measured in the simulation
+        for bit, value in qutils.get_result_bits(result, circuit).items():
+            if not bit in bits:
+                bits[bit] = value
 
-            for i in range(self.height * self.width):
-                piece = self.qchess.get_piece(i)
-                if piece == NullPiece: continue
-                
-                piece.qflag = 1 << self.qflag_index
-                self.qflag_index += 1
-        
-        all_collapsed = collapse_all
+        return bits
+
+    """
+        Returns an engine whose stored state includes the instructions that haven't been
+        simulated yet (in non-incremental mode, whose circuit has been compacted).
 
-        if not all_collapsed:
-            all_collapsed = True
+        In incremental mode, if none of them can pick a random outcome (see qutils.is_random),
+        they are simulated in place. Otherwise they are simulated on a copy of the engine that
+        measures with sample_rng, so reading the state never decides a measurement of the game
+        or changes its circuit (which keeps seeded games reproducible).
+    """
+    def get_updated_engine(self):
+        if self.incremental and not self.qcircuit.data:
+            return self
+
+        if not self.incremental and len(self.qcircuit.data) == self.compacted_circuit_size:
+            return self
+
+        if self.incremental and not qutils.is_random(self.qcircuit.data):
+            self.execute()
+            return self
 
-            for i in range(self.width * self.height):
-                if not self.qchess.get_piece(i).collapsed:
-                    all_collapsed = False
-                    break
+        engine = copy.copy(self)
+        engine.rng = self.sample_rng
+        engine.qubit_values = dict(self.qubit_values)
 
-        #the circuit is reset when all pieces are collapsed, even if
-        #no new pieces were collapsed in this call
-        #when all the qubits are |0> or |1>, it's cheaper to just reset
-        #the circuit than to keep track of all the qubits operations
-        if all_collapsed:
-            self.generate_circuit()
+        #the translated instructions are extended in place, so the copy translates its own
+        engine.native_circuit = None
 
-    def set_piece_uncollapsed(self, point):
-        if self.classical_board[point.x][point.y] != NullPiece:
-            self.classical_board[point.x][point.y].collapsed = False
+        engine.execute(compact=True)
 
-    def collapse_path(self, source, target, collapse_target=False, collapse_source=False):
-        qflag = 0
+        return engine
 
-        for piece in self.qchess.get_path_pieces(source, target):
-            qflag |= piece.qflag
+    """
+        The probabilities are calculated from the stored state,
+        and they're kept until the stored state changes.
+    """
+    def get_qubit_probabilities(self, indices):
+        engine = self.get_updated_engine()
 
-        source_piece = self.classical_board[source.x][source.y]
-        if source_piece != NullPiece and collapse_source:
-            #force the piece to get collapsed
-            source_piece.collapsed = False
+        if not engine.marginals_statevector is engine.statevector:
+            probabilities = np.abs(engine.statevector)**2
+            states = np.arange(len(engine.statevector))
 
-            qflag |= source_piece.qflag
+            engine.marginals = {
+                qubit: probabilities[(states >> i) & 1 == 1].sum()
+                for i, qubit in enumerate(engine.live_qubits)
+            }
+            engine.marginals_statevector = engine.statevector
 
-        target_piece = self.classical_board[target.x][target.y]
-        if target_piece != NullPiece and collapse_source:
-            #force the piece to get collapsed
-            target_piece.collapsed = False
+        return [
+            engine.marginals.get(qubit, engine.qubit_values.get(qubit, 0))
+            for qubit in [self.qregister[i] for i in indices]
+        ]
 
-            qflag |= target_piece.qflag
+    def sample_qubits(self, indices, n):
+        engine = self.get_updated_engine()
 
-        self.collapse_by_flag(qflag)
+        probabilities = np.abs(engine.statevector)**2
+        states = self.sample_rng.choice(len(probabilities), size=n, p=probabilities / probabilities.sum())
 
-        #return true if path is clear after collapse
-        return not bool(self.qchess.get_path_pieces(source, target))
+        samples = np.zeros((n, len(indices)), dtype=int)
 
-    def collapse_point(self, x, y):
-        self.collapse_by_flag(self.classical_board[x][y].qflag)
+        for j, qubit in enumerate([self.qregister[i] for i in indices]):
+            if qubit in engine.live_qubits:
+                samples[:, j] = (states >> engine.live_qubits.index(qubit)) & 1
+            else:
+                samples[:, j] = engine.qubit_values.get(qubit, 0)
 
-    def collapse_all(self):
-        self.collapse_by_flag(None, collapse_all=True)
+        return samples
 
     """
-        The idea of this function is to calculate all posible permutations
-        of the pieces entangled with target to see if, in any of the combinations,
-        target is not empty and the path is blocked at the same time. This
-        would violate double occupancy so a measurement has to be performed.
+        Replaces qcircuit with a circuit that prepares statevector (the state of qubits
+        after simulating it), so that in non-incremental mode the whole history of
+        the game isn't simulated again in every execution.
+
+        Only the qubits that are not |0> or |1> are prepared with an initialize.
     """
-    def does_slide_violate_double_occupancy(self, source, target):
-        target_piece = self.classical_board[target.x][target.y]
+    def compact_circuit(self, qubits, statevector):
+        self.store_statevector(qubits, statevector)
 
-        if target_piece == NullPiece: 
-            #target is always empty
-            return False
+        self.qcircuit = self.new_circuit()
 
-        entangled_points = []
-        path = self.qchess.get_path_points(source, target)
+        for qubit, value in self.qubit_values.items():
+            if value == 1:
+                self.qcircuit.x(qubit)
 
-        for i in range(self.width * self.height):
-            point = self.qchess.get_board_point(i)
+        if self.live_qubits:
+            self.qcircuit.initialize(self.statevector, self.live_qubits)
 
-            if self.classical_board[point.x][point.y].qflag & target_piece.qflag != 0:
-                entangled_points.append(point)
+        #the state is kept until the circuit changes (see get_qubit_probabilities)
+        self.compacted_circuit_size = len(self.qcircuit.data)
 
-        #if a piece is blocking the path independently of the entanglement
-        #of target, then DO is violated
-        for point in path:
-            if self.classical_board[point.x][point.y] != NullPiece and not point in entangled_points:
-                return True
+    """
+        Returns the instructions of qcircuit translated to native instructions of the simulator
+        (see qutils.get_native_instructions). Only the ones added since the last call are translated,
+        the rest are kept until qcircuit is replaced.
+    """
+    def get_native_data(self):
+        if not self.native_circuit is self.qcircuit:
+            self.native_circuit = self.qcircuit
+            self.native_data = []
+            self.native_length = 0
 
-        #the number of pieces is the number of 1s in the target qflag
-        number_of_pieces = list(bin(target_piece.qflag)).count('1')
+        for instruction, qargs, cargs in self.qcircuit.data[self.native_length:]:
+            self.native_data += qutils.get_native_instructions(instruction, qargs, cargs, qutils.backend)
 
-        assert(len(entangled_points) >= number_of_pieces)
+        self.native_length = len(self.qcircuit.data)
 
-        #contains 1 for each piece and the rest are zeroes (empty squares)
-        permutations = [1] * number_of_pieces + [0] * (len(entangled_points) - number_of_pieces)
+        return self.native_data
 
-        #unique permutations of number of pieces in all points
-        permutations = set(list(itertools.permutations(permutations)))
+    def new_circuit(self):
+        circuit = QuantumCircuit(self.qregister, self.cregister, self.cbit_misc, self.cbit_paths)
 
-        for perm in permutations:
-            blocked = False
-            target_empty = True
+        for qubit in self.aregister:
+            if not qubit.register in circuit.qregs:
+                circuit.add_register(qubit.register)
 
-            #entangled_points and all permutations have the same length
-            #so they correspond to the same point for the same index
-            for i, point in enumerate(entangled_points):
-                if point in path and perm[i] == 1:
-                    blocked = True
+        return circuit
 
-                if point == target and perm[i] == 1:
-                    target_empty = False
+    """
+        Returns number qubits known to be |0> that are not one of the squares of points,
+        so move gadgets can use them as ancillas as long as they leave them in |0>.
 
-            if blocked and not target_empty:
-                return True
+        Any empty square works, so ancilla qubits are only added
+        to the circuit if all the squares are occupied or part of the move.
+    """
+    def get_scratch_qubits(self, points, number=1):
+        indices = [self.qchess.get_array_index(point.x, point.y) for point in points]
 
-        return False
+        qubits = []
 
-    def standard_move(self, source, target, force=False):
-        piece = self.classical_board[source.x][source.y]
+        for i in range(self.width * self.height):
+            if len(qubits) == number:
+                return qubits
 
-        if not force and piece.type == PieceType.PAWN:
-            return self._standard_pawn_move(source, target)
+            if self.qchess.get_piece(i) == NullPiece and not i in indices:
+                qubits.append(self.qregister[i])
 
-        target_piece = self.classical_board[target.x][target.y]
+        missing = number - len(qubits)
 
-        if target_piece == NullPiece or target_piece == piece:
-            if piece.is_move_slide():
-                if self.entangle_path_flags(piece.qflag, source, target):
-                    piece.collapsed = False
+        if missing > len(self.aregister):
+            register = QuantumRegister(missing - len(self.aregister))
 
-                    #if something may be blocking then the piece might stay in place
-                    #so we don't want to remove it clasically
-                    if target_piece == NullPiece:
-                        target_piece = piece
-                
-                qutils.perform_standard_slide(self, source, target)
-            else:
-                qutils.perform_standard_jump(self, source, target)
+            self.aregister += list(register)
+            self.qcircuit.add_register(register)
 
-            self.classical_board[source.x][source.y] = target_piece.copy()
-            self.classical_board[target.x][target.y] = piece.copy()
-        else:
-            if target_piece.color == piece.color:
-                self.collapse_by_flag(target_piece.qflag)
-
-                if (
-                    self.classical_board[source.x][source.y] != NullPiece and
-                    self.classical_board[target.x][target.y] == NullPiece
-                ):
-                    new_source_piece = NullPiece
-
-                    if piece.is_move_slide():
-                        if self.entangle_path_flags(piece.qflag, source, target):
-                            #if something may be blocking then the piece might stay in place
-                            #so we don't want to remove it clasically
-                            piece.collapsed = False
-                            new_source_piece = piece
-                        
-                        qutils.perform_standard_slide(self, source, target)
-                    else:
-                        qutils.perform_standard_jump(self, source, target)
-
-                    self.classical_board[source.x][source.y] = new_source_piece.copy()
-                    self.classical_board[target.x][target.y] = piece.copy()
-            else:
-                self.collapse_by_flag(piece.qflag)
-
-                if self.classical_board[source.x][source.y] != NullPiece:
-                    path_empty = self.qchess.is_path_empty(source, target)
-
-                    #if the path is empty the move is just a jump
-                    if piece.is_move_slide() and not path_empty:
-                        """
-                            Afer qutils.perform_capture_slide the path is collapsed
-                            already unless does_slide_violate_double_occupancy returns 0,
-                            in which case entanglement occurs.
-                            We call collapse_path to update the classical board.
-                        """
-                        if qutils.perform_capture_slide(self, source, target):
-                            if self.does_slide_violate_double_occupancy(source, target):
-                                path_clear = self.collapse_path(source, target, collapse_source=True)
-
-                                if path_clear and self.classical_board[source.x][source.y] == NullPiece:
-                                    self.classical_board[target.x][target.y] = piece.copy()
-                            else:
-                                if not self.entangle_path_flags(piece.qflag, source, target):
-                                    self.classical_board[source.x][source.y] = NullPiece
-                                else:
-                                    piece.collapsed = False
-                                    
-                                self.classical_board[target.x][target.y] = piece.copy()
-                        else:
-                            path_clear = self.collapse_path(source, target, collapse_source=True)
-
-                            if path_clear and self.classical_board[source.x][source.y] == NullPiece:
-                                self.classical_board[target.x][target.y] = piece.copy()
-                    else:
-                        qutils.perform_capture_jump(self, source, target)
-
-                        self.classical_board[source.x][source.y] = NullPiece
-                        self.classical_board[target.x][target.y] = piece.copy()
-
-    def _standard_pawn_move(self, source, target):
-        pawn = self.classical_board[source.x][source.y]
-        target_piece = self.classical_board[target.x][target.y]
-
-        move_type, ep_point = pawn.is_move_valid(source, target, qchess=self.qchess)
-        
-        #this is checked in QChess class
-        assert(move_type != Pawn.MoveType.INVALID)
+        return qubits + self.aregister[:missing]
 
-        if (
-            move_type == Pawn.MoveType.SINGLE_STEP or
-            move_type == Pawn.MoveType.DOUBLE_STEP
-        ):
-            self.collapse_by_flag(target_piece.qflag)
+    def store_statevector(self, qubits, statevector):
+        self.statevector, values = remove_collapsed(statevector, len(qubits))
 
-            if (
-                self.classical_board[source.x][source.y] != NullPiece and
-                self.classical_board[target.x][target.y] == NullPiece
-            ):
-                if move_type == Pawn.MoveType.SINGLE_STEP:
-                    qutils.perform_standard_jump(self, source, target)
+        self.live_qubits = []
 
-                    self.classical_board[source.x][source.y] = NullPiece
-                else:
-                    if not self.entangle_path_flags(pawn.qflag, source, target):
-                        self.classical_board[source.x][source.y] = NullPiece
-                    else:
-                        pawn.collapsed = False
+        for qubit, value in zip(qubits, values):
+            if value is None:
+                self.live_qubits.append(qubit)
+            else:
+                self.qubit_values[qubit] = value
 
-                    qutils.perform_standard_slide(self, source, target)
+    def set_occupied(self, i):
+        self.set_qubit_value(self.qregister[i], 1)
 
-                self.classical_board[target.x][target.y] = pawn.copy()
+    def set_empty(self, i):
+        self.set_qubit_value(self.qregister[i], 0)
 
-        elif move_type == Pawn.MoveType.CAPTURE:
-            #pawn is the only piece that needs to collapse target when capturing
-            #because it can't move diagonally unless capturing
-            self.collapse_by_flag(pawn.qflag | target_piece.qflag)
+    """
+        Sets a qubit whose value is known to be the opposite one to value.
 
-            if (
-                self.classical_board[source.x][source.y] != NullPiece and
-                self.classical_board[target.x][target.y] != NullPiece
-            ):
-                qutils.perform_capture_jump(self, source, target)
+        In incremental mode its value is kept in qubit_values, which is changed directly
+        if no pending instruction uses the qubit, so nothing is added to the circuit.
+        Otherwise the X gate has to be placed after those instructions. In non-incremental
+        mode the circuit is the only record of the state, so the X gate is always needed.
+    """
+    def set_qubit_value(self, qubit, value):
+        if (
+            self.incremental and
+            not qubit in self.live_qubits and
+            not any(qubit in qargs for instruction, qargs, cargs in self.qcircuit.data)
+        ):
+            self.qubit_values[qubit] = value
+        else:
+            self.qcircuit.x(qubit)
 
-                self.classical_board[source.x][source.y] = NullPiece
-                self.classical_board[target.x][target.y] = pawn.copy()
+    def measure_qubits(self, indices):
+        qubits = [self.qregister[i] for i in indices]
 
-        elif move_type == Pawn.MoveType.EN_PASSANT:
-            if target_piece == NullPiece:
-                qutils.perform_standard_en_passant(self, source, target, ep_point)
+        #the stored state is measured directly if the simulation can't pick any outcome,
+        #so the outcome is the same whether the state has been read before (see get_updated_engine) or not
+        if self.incremental and not qutils.is_random(self.qcircuit.data):
+            if self.qcircuit.data:
+                self.execute()
 
-                self.classical_board[source.x][source.y] = NullPiece
-                self.classical_board[target.x][target.y] = pawn
-                self.classical_board[ep_point.x][ep_point.y] = NullPiece
+            return self.measure_statevector(qubits)
 
-            elif target_piece.color == pawn.color:
-                self.collapse_by_flag(target_piece.qflag)
+        for i in indices:
+            #measure the ith qubit to the ith bit
+            self.qcircuit.measure(self.qregister[i], self.cregister[i])
 
-                if self.classical_board[target.x][target.y] == NullPiece:
-                    qutils.perform_standard_en_passant(self, source, target, ep_point)
-                    
-                    self.classical_board[source.x][source.y] = NullPiece
-                    self.classical_board[target.x][target.y] = pawn.copy()
-                    self.classical_board[ep_point.x][ep_point.y] = NullPiece
-            else:
-                self.collapse_by_flag(pawn.qflag)
-
-                if self.classical_board[source.x][source.y] != NullPiece:
-                    qutils.perform_capture_en_passant(self, source, target, ep_point)
-
-                    self.classical_board[source.x][source.y] = NullPiece
-                    self.classical_board[target.x][target.y] = pawn.copy()
-                    self.classical_board[ep_point.x][ep_point.y] = NullPiece
-
-    def split_move(self, source, target1, target2):
-        piece = self.classical_board[source.x][source.y]
-        target_piece1 = self.classical_board[target1.x][target1.y]
-        target_piece2 = self.classical_board[target2.x][target2.y]
-
-        #the source piece is always swapped with the target2
-        #so unless the path is blocked we know what piece target2 has
-        new_source_piece = target_piece2
-
-        if piece.is_move_slide():
-            qutils.perform_split_slide(self, source, target1, target2)
-
-            path1_blocked = self.entangle_path_flags(piece.qflag, source, target1)
-            path2_blocked = self.entangle_path_flags(piece.qflag, source, target2)
-            
-            #set the source piece to null if any of the paths is not blocked,
-            #since the piece will always slide through that one if the other is blocked
-            if path1_blocked and path2_blocked and new_source_piece == NullPiece:
-                new_source_piece = piece
-                new_source_piece.collapsed = False
-        else:
-            qutils.perform_split_jump(self, source, target1, target2)
-
-        if not piece.collapsed or not target_piece1.collapsed:
-            #entangle only the pieces affected by iSwap_sqrt
-            self.entangle_flags(piece.qflag, target_piece1.qflag)
-
-        if target_piece1 == NullPiece:
-            self.classical_board[target1.x][target1.y] = piece.copy()
-
-        self.classical_board[target2.x][target2.y] = piece.copy()
-        self.classical_board[source.x][source.y] = new_source_piece.copy()
-
-        #only uncollapse the pieces if state |t1, t2> is not |00> or |11>
-        #because iSwap_sqrt leaves these states untouched
-        if target_piece1 == NullPiece:
-            self.set_piece_uncollapsed(target1)
-            self.set_piece_uncollapsed(target2)
-    
-    def merge_move(self, source1, source2, target):
-        piece1 = self.classical_board[source1.x][source1.y]
-        piece2 = self.classical_board[source2.x][source2.y]
-        target_piece = self.classical_board[target.x][target.y]
-
-        #the target piece is always swapped with the source2
-        #so unless the path is blocked we know what piece source2 has
-        new_source2_piece = target_piece
-
-        if piece1.is_move_slide():
-            qutils.perform_merge_slide(self, source1, source2, target)
-
-            self.entangle_path_flags(piece1.qflag, source1, target)
-            path2_blocked = self.entangle_path_flags(piece2.qflag, source2, target)
-                
-            if path2_blocked and new_source2_piece == NullPiece:
-                new_source2_piece = piece1
-                new_source2_piece.collapsed = False
-        else:
-            qutils.perform_merge_jump(self, source1, source2, target)
-   
-        if not piece1.collapsed or not piece2.collapsed:
-            #entangle only the pieces affected by iSwap_sqrt
-            self.entangle_flags(piece1.qflag, piece2.qflag)
+        bits = self.execute()
+        values = []
 
-        if target_piece == NullPiece:
-            self.classical_board[target.x][target.y] = piece1.copy()
+        for i in indices:
+            values.append(bits[self.cregister[i]])
 
-        self.classical_board[source1.x][source1.y] = piece2.copy()
-        self.classical_board[source2.x][source2.y] = new_source2_piece.copy()
+            #in incremental mode the stored state already holds the measured value
+            if self.incremental:
+                continue
 
-        if target_piece == NullPiece:
-            self.set_piece_uncollapsed(source1)
-            self.set_piece_uncollapsed(target)
+            #set to |0> or |1> in circuit
+            self.qcircuit.reset(self.qregister[i])
 
-    def castling_move(self, king_source, rook_source, king_target, rook_target):
-        king = self.classical_board[king_source.x][king_source.y]
-        rook = self.classical_board[rook_source.x][rook_source.y]
+            if values[-1] == 1:
+                self.qcircuit.x(self.qregister[i])
 
-        king_target_piece = self.classical_board[king_target.x][king_target.y]
-        rook_target_piece = self.classical_board[rook_target.x][rook_target.y]
+        return values
 
-        #collapse target pieces
-        self.collapse_by_flag(king_target_piece.qflag | rook_target_piece.qflag)
+    """
+        Measures the qubits in the state stored after the last simulation (in incremental mode),
+        collapsing it in place. Only valid if qcircuit is empty.
+    """
+    def measure_statevector(self, qubits):
+        live_qubits = [qubit for qubit in qubits if qubit in self.live_qubits]
 
-        #if both targets are empty
-        if (
-            self.classical_board[king_target.x][king_target.y] == NullPiece and
-            self.classical_board[rook_target.x][rook_target.y] == NullPiece
-        ):
-            #the path doesn't neccesarily have to be the shortest straight path
-            #between king and rook
-            king_path = self.qchess.get_path_points(king_source, king_target)
-            rook_path = self.qchess.get_path_points(rook_source, rook_target)
+        if live_qubits:
+            measure_amplitudes(
+                self.statevector, [self.live_qubits.index(qubit) for qubit in live_qubits], self.rng
+            )
 
-            # in general it's the unique combination of their paths
-            path = []
-            for point in king_path + rook_path:
-                if point == king_target or point == rook_target: continue
+            #the measured qubits are not live anymore
+            self.store_statevector(list(self.live_qubits), self.statevector)
 
-                #we don't need to include empty squares
-                if self.classical_board[point.x][point.y] == NullPiece: continue
+        return [self.qubit_values.get(qubit, 0) for qubit in qubits]
 
-                if not point in path:
-                    path.append(point)
+    """
+        Simulates circuit with qutils.run_circuit, keeping count of the simulations and their instructions.
+        Only the circuits that can pick a random outcome are seeded from rng.
+    """
+    def run_circuit(self, circuit, backend):
+        self.simulation_count += 1
+        self.simulated_instructions += len(circuit.data)
 
-            #exclude king_target and rook_target just in case
-            if king_target in path: path.remove(king_target)
-            if rook_target in path: path.remove(rook_target)
+        seed = self.get_simulator_seed() if qutils.is_random(circuit.data) else None
 
-            #perform the quantum move        
-            qutils.perform_castle(self, king_source, rook_source, king_target, rook_target, path)
+        return qutils.run_circuit(circuit, backend, seed)
 
-            if not path:
-                #remove from source only if path is empty
-                self.classical_board[king_source.x][king_source.y] = NullPiece
-                self.classical_board[rook_source.x][rook_source.y] = NullPiece
-            else:
-                #entangle with all the pieces in the path
-                path_qflags = 0
-                for point in path:
-                    path_qflags |= self.classical_board[point.x][point.y].qflag
-                
-                self.entangle_flags(king.qflag, rook.qflag)
-                self.entangle_flags(path_qflags, king.qflag)
-
-                king.collapsed = False
-                rook.collapsed = False
-
-            self.classical_board[king_target.x][king_target.y] = king.copy()
-            self.classical_board[rook_target.x][rook_target.y] = rook.copy()
+    """
+        Returns the seed of the next simulation, drawn from rng.
+    """
+    def get_simulator_seed(self):
+        return int(self.rng.integers(2**31))
+
+    def get_qubit(self, x, y):
+        return self.qregister[self.qchess.get_array_index(x, y)]
+
+    def get_bit(self, x, y):
+        return self.cregister[self.qchess.get_array_index(x, y)]
@@ -1,14 +1,32 @@
 import math
+from concurrent import futures
 
+import numpy as np
 from qiskit import QuantumCircuit, QuantumRegister
+from qiskit.circuit import Measure
+from qiskit.circuit.library import XGate
+from qiskit.extensions import UnitaryGate
 from qiskit.quantum_info.operators import Operator
 from qiskit import Aer
-from qiskit import execute
+from qiskit import execute, transpile, assemble
 from qiskit.tools.visualization import plot_histogram
 
+from qchess.engines import gadgets
+
 backend = Aer.get_backend('qasm_simulator')
 
-MAX_QUBIT_MEMORY = backend.MAX_QUBIT_MEMORY
+#used in incremental mode, since it returns the state after measurement
+statevector_backend = Aer.get_backend('statevector_simulator')
+
+#newer versions of Aer only give it in the configuration
+MAX_QUBIT_MEMORY = getattr(backend, 'MAX_QUBIT_MEMORY', backend.configuration().n_qubits)
+
+#qubits with a smaller probability of being |0> or |1> are considered collapsed
+PROBABILITY_EPSILON = 1e-10
+
+#number of instructions after which the circuit is replaced with the
+#preparation of its state (only used in non-incremental mode)
+COMPACTION_SIZE = 200
 
 b = math.sqrt(2)
 
@@ -19,19 +37,6 @@ iSwap = Operator([
     [0, 0, 0, 1],
 ])
 
-#when the controlled qubit holds if a path is clear
-#then this gate can be understood as the slide gate
-iSwap_controlled = Operator([
-    [1, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 1j, 0, 0, 0, 0, 0],
-    [0, 1j, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 1, 0, 0, 0, 0],
-    [0, 0, 0, 0, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 0, 0],
-    [0, 0, 0, 0, 0, 0, 1, 0],
-    [0, 0, 0, 0, 0, 0, 0, 1],
-])
-
 iSwap_sqrt = Operator([
     [1, 0, 0, 0],
     [0, 1/b, 1j/b, 0],
@@ -39,19 +44,301 @@ iSwap_sqrt = Operator([
     [0, 0, 0, 1],
 ])
 
-#in base s, t, control
-iSwap_sqrt_controlled = Operator([
-    [1, 0, 0, 0, 0, 0, 0, 0],
-    [0, 1/b, 1j/b, 0, 0, 0, 0, 0],
-    [0, 1j/b, 1/b, 0, 0, 0, 0, 0],
-    [0, 0, 0, 1, 0, 0, 0, 0],
-    [0, 0, 0, 0, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 0, 0],
-    [0, 0, 0, 0, 0, 0, 1, 0],
-    [0, 0, 0, 0, 0, 0, 0, 1],
+#instructions the simulators support besides their basis gates
+NATIVE_INSTRUCTIONS = ['measure', 'reset', 'barrier']
 
-])
+#the only instructions whose result can be random
+RANDOM_INSTRUCTIONS = ['measure', 'reset']
+
+"""
+    Returns if any of the instructions (in the format of QuantumCircuit.data)
+    measures or resets a qubit, so simulating them can pick a random outcome.
+"""
+def is_random(instructions):
+    return any(instruction.name in RANDOM_INSTRUCTIONS for instruction, qargs, cargs in instructions)
+
+"""
+    Returns the instruction (in the format of QuantumCircuit.data) as a list
+    of instructions that backend can simulate without transpiling them.
+
+    Only unconditioned instructions are translated, all the ones with
+    a condition used by the gadgets are supported by the simulators.
+"""
+def get_native_instructions(instruction, qargs, cargs, backend):
+    if (
+        instruction.name in NATIVE_INSTRUCTIONS or
+        instruction.name in backend.configuration().basis_gates or
+        instruction.condition
+    ):
+        return [(instruction, qargs, cargs)]
+
+    circuit = QuantumCircuit(len(qargs), len(cargs)) if cargs else QuantumCircuit(len(qargs))
+    circuit.append(instruction, circuit.qubits, circuit.clbits)
+
+    #optimizations assume that the qubits start at |0>, so they can't be used here
+    circuit = transpile(circuit, backend, optimization_level=0)
+
+    qubit_map = dict(zip(circuit.qubits, qargs))
+    clbit_map = dict(zip(circuit.clbits, cargs))
+
+    return [
+        (native_instruction, [qubit_map[qubit] for qubit in native_qargs], [clbit_map[bit] for bit in native_cargs])
+        for native_instruction, native_qargs, native_cargs in circuit.data
+    ]
+
+"""
+    Simulates circuit with one shot, sending it directly to backend.
+    Every instruction must be native (see get_native_instructions).
+    The simulator picks the outcome of the measurements with seed (random if None).
+"""
+def run_circuit(circuit, backend, seed=None):
+    qobj = assemble(circuit, backend, shots=1, seed_simulator=seed)
+
+    return backend.run(qobj).result()
+
+"""
+    Aer runs all its jobs in one shared thread pool, whose thread doesn't exist in
+    the processes forked after using it (so their jobs would never finish).
+    Must be called by those processes before simulating anything, to give the
+    backends of the process an executor of their own.
+"""
+def reset_after_fork():
+    executor = futures.ThreadPoolExecutor(max_workers=1)
+
+    for simulator in [backend, statevector_backend]:
+        if hasattr(simulator, 'set_options'):
+            simulator.set_options(executor=executor)
+
+        else:
+            #older versions of Aer have no executor option, and their pool is the one of the job class
+            from qiskit.providers.aer.aerjob import AerJob
+
+            AerJob._executor = executor
+
+"""
+    Returns the value of every classical bit of circuit in a one shot result.
+"""
+def get_result_bits(result, circuit):
+    #get_counts() gives something like '1 00000001', with registers in reverse order
+    registers_values = list(result.get_counts(circuit).keys())[0].split(' ')[::-1]
+
+    bits = {}
+
+    for register, register_value in zip(circuit.cregs, registers_values):
+        for i, char in enumerate(register_value[::-1]):
+            bits[register[i]] = int(char)
+
+    return bits
+
+"""
+    Applies instruction to qubits that are known to be |0> or |1>, if the
+    result is also |0> or |1> for all of them (ignoring the global phase).
+
+    values holds the value of each qubit (0 if not present) and bits
+    the value of each measured classical bit. Both are updated in place.
+
+    Returns false if the instruction can't be computed classically.
+"""
+def apply_classically(instruction, qargs, cargs, values, bits):
+    if instruction.name == 'x':
+        values[qargs[0]] = values.get(qargs[0], 0) ^ 1
+
+    elif instruction.name in ['cx', 'ccx'] or instruction.name.startswith('mcx'):
+        #the remaining qubits are ancillas, which are left untouched
+        controls = qargs[:instruction.num_ctrl_qubits]
+        target = qargs[instruction.num_ctrl_qubits]
+
+        if all(values.get(qubit, 0) == 1 for qubit in controls):
+            values[target] = values.get(target, 0) ^ 1
+
+    elif instruction.name == 'reset':
+        values[qargs[0]] = 0
+
+    elif instruction.name == 'measure':
+        bits[cargs[0]] = values.get(qargs[0], 0)
+
+    elif instruction.name == 'unitary':
+        index = sum(values.get(qubit, 0) << i for i, qubit in enumerate(qargs))
+        column = instruction.to_matrix()[:, index]
+
+        new_index = np.flatnonzero(np.abs(column) > PROBABILITY_EPSILON)
+
+        if len(new_index) != 1:
+            return False
+
+        for i, qubit in enumerate(qargs):
+            values[qubit] = (int(new_index[0]) >> i) & 1
+    else:
+        return False
+
+    return True
+
+"""
+    Returns the instructions (in the format of QuantumCircuit.data) that
+    write value to bit using qubit, which must be |0> and is left in |0>.
+"""
+def get_bit_write(qubit, bit, value):
+    if value == 0:
+        return [(Measure(), [qubit], [bit])]
+
+    return [
+        (XGate(), [qubit], []),
+        (Measure(), [qubit], [bit]),
+        (XGate(), [qubit], []),
+    ]
+
+#gates that can be merged with the ones next to them
+MERGEABLE_GATES = ['x', 'cx', 'ccx', 'unitary']
+
+def _is_mergeable(instruction):
+    return instruction.name in MERGEABLE_GATES and not instruction.condition
+
+"""
+    Peephole optimization of a list of instructions (in the format of QuantumCircuit.data).
+
+    Consecutive unconditioned gates applied to the same qubits (in the same order) are merged
+    in a single unitary, which is removed if it's the identity (up to a global phase),
+    like an X gate applied twice.
+
+    If measured_only is true, the instructions that can't affect any measurement are
+    removed too, which is only valid if the state afterwards isn't needed.
+"""
+def optimize_instructions(instructions, measured_only=False):
+    optimized = []
+
+    #indices in optimized of the instructions applied to each qubit, in order
+    applied = {}
+
+    for instruction, qargs, cargs in instructions:
+        qargs = list(qargs)
+        previous = [applied[qubit][-1] if applied.get(qubit) else None for qubit in qargs]
+
+        if (
+            _is_mergeable(instruction) and previous[0] is not None and
+            all(i == previous[0] for i in previous) and
+            optimized[previous[0]][1] == qargs and
+            _is_mergeable(optimized[previous[0]][0])
+        ):
+            i = previous[0]
+            matrix = instruction.to_matrix() @ optimized[i][0].to_matrix()
+
+            if np.allclose(matrix, matrix[0, 0] * np.identity(len(matrix))):
+                optimized[i] = None
 
+                for qubit in qargs:
+                    applied[qubit].pop()
+            else:
+                optimized[i] = (UnitaryGate(matrix), qargs, [])
+
+            continue
+
+        for qubit in qargs:
+            applied.setdefault(qubit, []).append(len(optimized))
+
+        optimized.append((instruction, qargs, list(cargs)))
+
+    optimized = [data for data in optimized if data is not None]
+
+    if measured_only:
+        optimized = _remove_unmeasured(optimized)
+
+    return optimized
+
+"""
+    Removes the instructions that don't affect any measured qubit.
+"""
+def _remove_unmeasured(instructions):
+    needed_qubits = set()
+    needed = []
+
+    for instruction, qargs, cargs in reversed(instructions):
+        if instruction.name == 'measure' or any(qubit in needed_qubits for qubit in qargs):
+            needed_qubits.update(qargs)
+            needed.append((instruction, qargs, cargs))
+
+    return needed[::-1]
+
+#cache of the operators returned by _zero_controlled_x
+_zero_controlled_x_operators = {}
+
+"""
+    Returns an operator that flips the first qubit if all
+    the other num_controls qubits are |0>.
+    It's a permutation, so it doesn't need any ancilla qubits.
+"""
+def _zero_controlled_x(num_controls):
+    if not num_controls in _zero_controlled_x_operators:
+        size = 2**(num_controls + 1)
+
+        matrix = np.identity(size)
+        matrix[[0, 1]] = matrix[[1, 0]]
+
+        _zero_controlled_x_operators[num_controls] = Operator(matrix)
+
+    return _zero_controlled_x_operators[num_controls]
+
+"""
+    Measures if any of the points is occupied (1) or not (0) to bit,
+    without measuring the value of each point individually.
+
+    The result is computed in a qubit known to be |0> that is not part of the
+    move (see QiskitEngine.get_scratch_qubits), which is left in |0> afterwards.
+
+    The original circuits held this value in an ancilla that was reset
+    in the next move, so measuring it right away doesn't change the result.
+"""
+def _measure_path_blocked(engine, points, bit, move_points):
+    scratch, = engine.get_scratch_qubits(move_points)
+    control_qubits = [engine.get_qubit(point.x, point.y) for point in points]
+
+    engine.qcircuit.x(scratch)
+    engine.qcircuit.unitary(_zero_controlled_x(len(control_qubits)), [scratch] + control_qubits)
+
+    engine.qcircuit.measure(scratch, bit)
+    engine.qcircuit.reset(scratch)
+
+#cache of the operators of the fused gadgets
+_fused_operators = {}
+
+"""
+    Applies the fused gadget of kind (see engines/gadgets.py) to the squares of
+    move_points, controlled by the paths given by BoardEngine.get_uncertain_points.
+
+    The flags are held in scratch qubits, which are reset afterwards.
+    Returns false (and does nothing) if the gadget is too big to be fused
+    or its squares aren't all different.
+"""
+def _apply_fused_gadget(engine, kind, move_points, paths, points):
+    key = tuple(None if path is None else len(path) for path in paths)
+
+    if gadgets.get_num_qubits(kind, key) > gadgets.MAX_FUSED_QUBITS:
+        return False
+
+    if not gadgets.are_squares_distinct(move_points, paths):
+        return False
+
+    if not (kind, key) in _fused_operators:
+        _fused_operators[(kind, key)] = Operator(gadgets.get_gadget(kind, key))
+
+    flags = engine.get_scratch_qubits(points, len([path for path in paths if path]))
+
+    qubits = flags + [engine.get_qubit(point.x, point.y) for point in move_points]
+
+    for path in paths:
+        if path:
+            qubits += [engine.get_qubit(point.x, point.y) for point in path]
+
+    engine.qcircuit.unitary(_fused_operators[(kind, key)], qubits, label=kind)
+
+    for flag in flags:
+        engine.qcircuit.reset(flag)
+
+    return True
+
+"""
+    Captures are done by resetting the target before moving to it, instead of
+    swapping the captured piece to an ancilla that is never used again.
+"""
 def perform_standard_jump(engine, source, target):
     qsource = engine.get_qubit(source.x, source.y)
     qtarget = engine.get_qubit(target.x, target.y)
@@ -62,11 +349,9 @@ def perform_capture_jump(engine, source, target):
     qsource = engine.get_qubit(source.x, source.y)
     qtarget = engine.get_qubit(target.x, target.y)
 
-    #this ancilla qubit is going to hold the captured piece
-    captured_piece = engine.aregister[0]
-    engine.qcircuit.reset(captured_piece)
+    #remove the captured piece
+    engine.qcircuit.reset(qtarget)
 
-    engine.qcircuit.unitary(iSwap, [qtarget, captured_piece], label='iSwap')
     engine.qcircuit.unitary(iSwap, [qsource, qtarget], label='iSwap')
 
 def perform_split_jump(engine, source, target1, target2):
@@ -86,24 +371,28 @@ def perform_merge_jump(engine, source1, source2, target):
     engine.qcircuit.unitary(iSwap_sqrt, [qsource1, qtarget], label='iSwap_sqrt')
 
 def perform_standard_slide(engine, source, target):
-    control_qubits = []
+    path_points = engine.qchess.get_path_points(source, target)
+    path = engine.get_uncertain_points(path_points)
+
+    #the path is always blocked
+    if path is None:
+        return
+
+    #the path is always clear
+    if not path:
+        perform_standard_jump(engine, source, target)
+        return
 
-    for point in engine.qchess.get_path_points(source, target):
-        control_qubits.append(engine.get_qubit(point.x, point.y))
-        engine.qcircuit.x(engine.get_qubit(point.x, point.y))
+    if _apply_fused_gadget(engine, 'slide', [source, target], [path], [source, target] + path_points):
+        return
 
     qsource = engine.get_qubit(source.x, source.y)
     qtarget = engine.get_qubit(target.x, target.y)
-    
-    path_ancilla = engine.aregister[0]
-    engine.qcircuit.reset(path_ancilla)
-    engine.qcircuit.x(path_ancilla)
 
-    engine.qcircuit.mct(control_qubits, path_ancilla, engine.mct_register, mode='advanced')
-    engine.qcircuit.unitary(iSwap_controlled, [qsource, qtarget, path_ancilla])
+    _measure_path_blocked(engine, path, engine.cbit_misc[0], [source, target] + path_points)
 
-    for point in engine.qchess.get_path_points(source, target):
-        engine.qcircuit.x(engine.get_qubit(point.x, point.y))
+    #only move if the path is clear
+    engine.qcircuit.unitary(iSwap, [qsource, qtarget], label='iSwap').c_if(engine.cbit_misc, 0)
 
 """
     *The source piece has already been collapsed before this is called*
@@ -114,57 +403,39 @@ def perform_standard_slide(engine, source, target):
         -The path is not clear but the target is empty
 
     Then there's no double occupancy and the piece can capture.
+
+    Both if the path is blocked and if the target is occupied are measured,
+    since the original circuit (with ancillas) ended up measuring both too:
+    the condition is that the target is empty whenever the path is blocked,
+    and the captured piece was moved to an ancilla that was reset later when it's clear.
+
+    The circuit isn't simulated here, BoardEngine knows if the condition can be
+    false without knowing the measured values (see BoardEngine.standard_move).
 """
 def perform_capture_slide(engine, source, target):
-    control_qubits = []
-
-    for point in engine.qchess.get_path_points(source, target):
-        control_qubits.append(engine.get_qubit(point.x, point.y))
-        engine.qcircuit.x(engine.get_qubit(point.x, point.y))
+    path_points = engine.qchess.get_path_points(source, target)
+    path = engine.get_uncertain_points(path_points)
 
     qsource = engine.get_qubit(source.x, source.y)
     qtarget = engine.get_qubit(target.x, target.y)
 
-    #holds if the path is clear or not
-    path_ancilla = engine.aregister[0]
-    engine.qcircuit.reset(path_ancilla)
-    engine.qcircuit.x(path_ancilla)
-
-    engine.qcircuit.mct(control_qubits, path_ancilla, engine.mct_register, mode='advanced')
+    #the path is always clear
+    if path == []:
+        perform_capture_jump(engine, source, target)
+        return
 
-    #holds the final condition that's going to be measured
-    cond_ancilla = engine.aregister[1]
-    engine.qcircuit.reset(cond_ancilla)
+    #the path is always blocked, so the piece doesn't move
+    if path is None:
+        return
 
-    #holds the captured piece
-    captured_piece = engine.aregister[2]
-    engine.qcircuit.reset(captured_piece)
+    _measure_path_blocked(engine, path, engine.cbit_paths[0], [source, target] + path_points)
+    engine.qcircuit.measure(qtarget, engine.cbit_paths[1])
 
-    #path is not blocked
-    engine.qcircuit.x(path_ancilla)
-    engine.qcircuit.cx(path_ancilla, cond_ancilla)
-    engine.qcircuit.x(path_ancilla)
+    #path clear and target empty
+    engine.qcircuit.unitary(iSwap, [qsource, qtarget], label='iSwap').c_if(engine.cbit_paths, 0b00)
 
-    #blocked but target empty
-    engine.qcircuit.x(qtarget)
-    engine.qcircuit.ccx(qtarget, path_ancilla, cond_ancilla)
-    engine.qcircuit.x(qtarget)
-
-    engine.qcircuit.measure(cond_ancilla, engine.cbit_misc[0])
-
-    engine.qcircuit.unitary(iSwap_controlled, [qtarget, captured_piece, path_ancilla]).c_if(engine.cbit_misc, 1)
-    engine.qcircuit.unitary(iSwap_controlled, [qsource, qtarget, path_ancilla]).c_if(engine.cbit_misc, 1)
-
-    for qubit in control_qubits:
-        engine.qcircuit.x(qubit)
-
-    result = execute(engine.qcircuit, backend=backend, shots=1).result()
-
-    #since get_counts() gives '1 00000001'
-    #a bit hacky but I don't know any other way to get this result
-    cbit_value = int(list(result.get_counts().keys())[0].split(' ')[0])
-
-    return (cbit_value == 1)
+    #path clear and target captured (the target is still occupied by the source piece)
+    engine.qcircuit.x(qsource).c_if(engine.cbit_paths, 0b10)
 
 """
     Since the differences between both operations are only two gates,
@@ -179,80 +450,59 @@ def _slide_split_merge(engine, single, double1, double2, is_split):
     qdouble1 = engine.get_qubit(double1.x, double1.y)
     qdouble2 = engine.get_qubit(double2.x, double2.y)
 
-    #get all qubits in first path
-    control_qubits1 = []
-    for point in engine.qchess.get_path_points(single, double1):
-        control_qubits1.append(engine.get_qubit(point.x, point.y))
-        engine.qcircuit.x(engine.get_qubit(point.x, point.y))
+    path_points1 = engine.qchess.get_path_points(single, double1)
+    path_points2 = engine.qchess.get_path_points(single, double2)
 
-    #holds if the first path is clear or not
-    path_ancilla1 = engine.aregister[0]
-    engine.qcircuit.reset(path_ancilla1)
-    engine.qcircuit.x(path_ancilla1)
+    path1 = engine.get_uncertain_points(path_points1)
+    path2 = engine.get_uncertain_points(path_points2)
 
-    #perform their combined CNOT 
-    engine.qcircuit.mct(control_qubits1, path_ancilla1, engine.mct_register, mode='advanced')
+    move_points = [single, double1, double2] + path_points1 + path_points2
 
-    #undo the X
-    for qubit in control_qubits1:
-        engine.qcircuit.x(qubit)
+    kind = 'split' if is_split else 'merge'
 
-    #get all qubits in second path
-    control_qubits2 = []
-    for point in engine.qchess.get_path_points(single, double2):
-        control_qubits2.append(engine.get_qubit(point.x, point.y))
-        engine.qcircuit.x(engine.get_qubit(point.x, point.y))
+    if (path1 or path2) and _apply_fused_gadget(engine, kind, [single, double1, double2], [path1, path2], move_points):
+        return
 
-    #holds if the second path is clear or not
-    path_ancilla2 = engine.aregister[1]
-    engine.qcircuit.reset(path_ancilla2)
-    engine.qcircuit.x(path_ancilla2)
+    #the paths that are not known are measured (blocked is 1)
+    #and each operation is conditioned on their values
+    uncertain = [i for i, path in enumerate([path1, path2]) if path]
+    register = engine.cbit_paths if len(uncertain) == 2 else engine.cbit_misc
 
-    #perform their combined CNOT
-    engine.qcircuit.mct(control_qubits2, path_ancilla2, engine.mct_register, mode='advanced')
+    conditions = []
 
-    for qubit in control_qubits2:
-        engine.qcircuit.x(qubit)
+    for i, path in enumerate([path1, path2]):
+        if path is None:
+            conditions.append([1])
+        elif path == []:
+            conditions.append([0])
+        else:
+            _measure_path_blocked(engine, path, register[uncertain.index(i)], move_points)
+            conditions.append([0, 1])
 
-    #holds the control for jump and slide
-    control_ancilla = engine.aregister[2]
-    engine.qcircuit.reset(control_ancilla)
-    engine.qcircuit.x(control_ancilla)
+    def apply(gate, qubits, label, blocked1, blocked2):
+        if not blocked1 in conditions[0] or not blocked2 in conditions[1]:
+            return
 
-    #perform the split/merge
-    engine.qcircuit.x(path_ancilla1)
-    engine.qcircuit.x(path_ancilla2)
-    engine.qcircuit.ccx(path_ancilla1, path_ancilla2, control_ancilla)
+        instruction = engine.qcircuit.unitary(gate, qubits, label=label)
 
+        if uncertain:
+            #value of the measured bits
+            value = sum([blocked1, blocked2][i] << j for j, i in enumerate(uncertain))
+            instruction.c_if(register, value)
+
+    #perform the split/merge if both paths are clear
     if is_split:
-        engine.qcircuit.unitary(iSwap_sqrt_controlled, [qdouble1, qsingle, control_ancilla])
-        engine.qcircuit.unitary(iSwap_controlled, [qsingle, qdouble2, control_ancilla])
+        apply(iSwap_sqrt, [qdouble1, qsingle], 'iSwap_sqrt', 0, 0)
+        apply(iSwap, [qsingle, qdouble2], 'iSwap', 0, 0)
     else:
-        engine.qcircuit.unitary(iSwap_controlled, [qsingle, qdouble2, control_ancilla])
-        engine.qcircuit.unitary(iSwap_sqrt_controlled, [qdouble1, qsingle, control_ancilla])
-
-    engine.qcircuit.x(path_ancilla1)
-    engine.qcircuit.x(path_ancilla2)
+        apply(iSwap, [qsingle, qdouble2], 'iSwap', 0, 0)
+        apply(iSwap_sqrt, [qdouble1, qsingle], 'iSwap_sqrt', 0, 0)
 
-    #reset the control
-    engine.qcircuit.reset(control_ancilla)
-    engine.qcircuit.x(control_ancilla)
+    #perform one jump if only the first path is clear
+    apply(iSwap, [qdouble1, qsingle], 'iSwap', 0, 1)
 
-    #perform one jump
-    engine.qcircuit.x(path_ancilla1)
-    engine.qcircuit.ccx(path_ancilla1, path_ancilla2, control_ancilla)
-    engine.qcircuit.unitary(iSwap_controlled, [qdouble1, qsingle, control_ancilla])
-    engine.qcircuit.x(path_ancilla1)
-
-    #reset the control
-    engine.qcircuit.reset(control_ancilla)
-    engine.qcircuit.x(control_ancilla)
-
-    #perform the other jump
-    engine.qcircuit.x(path_ancilla2)
-    engine.qcircuit.ccx(path_ancilla1, path_ancilla2, control_ancilla)
-    engine.qcircuit.unitary(iSwap_controlled, [qsingle, qdouble2, control_ancilla])
-    engine.qcircuit.x(path_ancilla2)
+    #perform the other jump if only the second path is clear
+    apply(iSwap, [qsingle, qdouble2], 'iSwap', 1, 0)
 
 def perform_split_slide(engine, source, target1, target2):
     _slide_split_merge(engine, source, target1, target2, is_split=True)
@@ -265,47 +515,38 @@ def perform_standard_en_passant(engine, source, target, ep_target):
     qtarget = engine.get_qubit(target.x, target.y)
     qep_target = engine.get_qubit(ep_target.x, ep_target.y)
 
-    captured_ancilla = engine.aregister[0]
-    engine.qcircuit.reset(captured_ancilla)
+    scratch, = engine.get_scratch_qubits([source, target, ep_target])
 
-    #holds if both source and ep_target are empty or not at the same time
-    both_pieces_ancilla = engine.aregister[1]
-    engine.qcircuit.reset(both_pieces_ancilla)
+    #measure if both source and ep_target are occupied at the same time
+    engine.qcircuit.ccx(qsource, qep_target, scratch)
+    engine.qcircuit.measure(scratch, engine.cbit_misc[0])
+    engine.qcircuit.reset(scratch)
 
-    engine.qcircuit.ccx(qsource, qep_target, both_pieces_ancilla)
-    engine.qcircuit.x(both_pieces_ancilla)
-
-    engine.qcircuit.unitary(iSwap_controlled, [qep_target, captured_ancilla, both_pieces_ancilla])
-    engine.qcircuit.unitary(iSwap_controlled, [qsource, qtarget, both_pieces_ancilla])
+    #in that case ep_target is known to be occupied, so it's captured with an X
+    engine.qcircuit.x(qep_target).c_if(engine.cbit_misc, 1)
+    engine.qcircuit.unitary(iSwap, [qsource, qtarget], label='iSwap').c_if(engine.cbit_misc, 1)
 
 def perform_capture_en_passant(engine, source, target, ep_target):
     qsource = engine.get_qubit(source.x, source.y)
     qtarget = engine.get_qubit(target.x, target.y)
     qep_target = engine.get_qubit(ep_target.x, ep_target.y)
 
-    #since this move can capture two pieces at the same time,
-    #we need two ancillas to hold them
-    captured_ancilla1 = engine.aregister[0]
-    engine.qcircuit.reset(captured_ancilla1)
-
-    captured_ancilla2 = engine.aregister[1]
-    engine.qcircuit.reset(captured_ancilla2)
+    scratch, = engine.get_scratch_qubits([source, target, ep_target])
 
-    #holds if any of target, ep_target exist
+    #measure if any of target, ep_target exist
     #Note: It's impossible for them to exist at the same time (during this function's call),
     #   since if they did that would mean that target piece has reached its position
     #   after the pawn moved and thus EP would not be not a valid move.
-    any_piece_ancilla = engine.aregister[2]
-    engine.qcircuit.reset(any_piece_ancilla)
+    engine.qcircuit.cx(qep_target, scratch)
+    engine.qcircuit.cx(qtarget, scratch)
+    engine.qcircuit.measure(scratch, engine.cbit_misc[0])
+    engine.qcircuit.reset(scratch)
 
-    engine.qcircuit.cx(qep_target, any_piece_ancilla)
-    engine.qcircuit.cx(qtarget, any_piece_ancilla)
+    #capture the pieces, if there are none both qubits are already |0>
+    engine.qcircuit.reset(qep_target)
+    engine.qcircuit.reset(qtarget)
 
-    engine.qcircuit.x(any_piece_ancilla)
-
-    engine.qcircuit.unitary(iSwap_controlled, [qep_target, captured_ancilla1, any_piece_ancilla])
-    engine.qcircuit.unitary(iSwap_controlled, [qtarget, captured_ancilla2, any_piece_ancilla])
-    engine.qcircuit.unitary(iSwap_controlled, [qsource, qtarget, any_piece_ancilla])
+    engine.qcircuit.unitary(iSwap, [qsource, qtarget], label='iSwap').c_if(engine.cbit_misc, 1)
 
 #path holds all points that must be empty for the move to be valid (excluding targets)
 def perform_castle(engine, king_source, rook_source, king_target, rook_target, path=None):
@@ -314,28 +555,28 @@ def perform_castle(engine, king_source, rook_source, king_target, rook_target, p
     qking_target = engine.get_qubit(king_target.x, king_target.y)
     qrook_target = engine.get_qubit(rook_target.x, rook_target.y)
 
+    move_points = [king_source, rook_source, king_target, rook_target]
+
     if path:
-        #holds all the qubits of the path
-        control_qubits = []
-        for point in path:
-            control_qubits.append(engine.get_qubit(point.x, point.y))
-            engine.qcircuit.x(engine.get_qubit(point.x, point.y))
+        move_points += path
+        path = engine.get_uncertain_points(path)
 
-        #holds if the path is empty or not
-        path_ancilla = engine.aregister[0]
-        engine.qcircuit.reset(path_ancilla)
-        engine.qcircuit.x(path_ancilla)
+        #the path is always blocked
+        if path is None:
+            return
 
-        engine.qcircuit.mct(control_qubits, path_ancilla, engine.mct_register, mode='advanced')
+    if path and _apply_fused_gadget(
+        engine, 'castle', [king_source, king_target, rook_source, rook_target], [path], move_points
+    ):
+        return
 
-        #undo the x
-        for qubit in control_qubits:
-            engine.qcircuit.x(qubit)
+    if path:
+        _measure_path_blocked(engine, path, engine.cbit_misc[0], move_points)
 
-        #perform the movement
-        engine.qcircuit.unitary(iSwap_controlled, [qking_source, qking_target, path_ancilla])
-        engine.qcircuit.unitary(iSwap_controlled, [qrook_source, qrook_target, path_ancilla])
+        #perform the movement if the path is empty
+        engine.qcircuit.unitary(iSwap, [qking_source, qking_target], label='iSwap').c_if(engine.cbit_misc, 0)
+        engine.qcircuit.unitary(iSwap, [qrook_source, qrook_target], label='iSwap').c_if(engine.cbit_misc, 0)
     else:
         #perform the movement
         engine.qcircuit.unitary(iSwap, [qking_source, qking_target])
-        engine.qcircuit.unitary(iSwap, [qrook_source, qrook_target])
\ No newline at end of file
+        engine.qcircuit.unitary(iSwap, [qrook_source, qrook_target])
@@ -0,0 +1,172 @@
+from fractions import Fraction
+import math
+
+from .sparse_state import SparseState
+
+"""
+Arithmetic over the numbers a + b*w + c*w^2 + d*w^3, where w = e^(i*pi/4),
+stored as tuples (a, b, c, d) of integers.
+
+They include the gaussian integers (i = w^2) and sqrt(2) = w - w^3, so every
+amplitude the gadgets can produce is one of them (up to a power of sqrt(2)).
+"""
+ZERO = (0, 0, 0, 0)
+ONE = (1, 0, 0, 0)
+
+def add(n, m):
+    return tuple(a + b for a, b in zip(n, m))
+
+#multiplying by w shifts the coefficients, since w^4 = -1
+def times_w(n):
+    return (-n[3], n[0], n[1], n[2])
+
+def times_i(n):
+    return times_w(times_w(n))
+
+def times_sqrt2(n):
+    #w*n - w^3*n
+    a, b, c, d = n
+    return (b - d, a + c, b + d, c - a)
+
+"""
+    Returns n / sqrt(2), or None if the result doesn't have integer coefficients.
+"""
+def divide_sqrt2(n):
+    m = times_sqrt2(n)
+
+    if any(a % 2 for a in m):
+        return None
+
+    return tuple(a // 2 for a in m)
+
+"""
+    Returns |n|^2 as a pair (x, y) meaning x + y*sqrt(2).
+"""
+def norm_squared(n):
+    a, b, c, d = n
+
+    #product of n and its conjugate (a, -d, -c, -b), all the imaginary parts cancel out
+    x = a*a + b*b + c*c + d*d
+    y = a*b + b*c + c*d - d*a
+
+    return x, y
+
+"""
+Same as SparseState, but the amplitudes are stored exactly, so they never
+accumulate any rounding error no matter how long the game is.
+
+The state isn't kept normalized: every iSwap_sqrt multiplies the untouched amplitudes
+by sqrt(2) instead of dividing the rest, and measurements just remove the amplitudes
+of the other outcomes. A common sqrt(2) factor is removed when possible to keep the
+integers small. Probabilities are calculated relative to the total norm.
+
+Every amplitude is a tuple of four python integers, so the state takes more memory than
+the complex amplitudes of SparseState (it's only exact, not smaller). The probabilities
+are exact too, but they're converted to floating point numbers to draw the outcome
+of a measurement with the random generator.
+"""
+class ExactSparseState(SparseState):
+    def __init__(self, num_qubits):
+        super().__init__(num_qubits)
+
+        self.amplitudes = {0: ONE}
+
+    def iswap(self, qubit1, qubit2, controls=None):
+        mask, value = self._controls_mask(controls)
+        bits = (1 << qubit1) | (1 << qubit2)
+
+        amplitudes = {}
+
+        for state, amplitude in self.amplitudes.items():
+            if state & mask == value and (state >> qubit1) & 1 != (state >> qubit2) & 1:
+                state ^= bits
+                amplitude = times_i(amplitude)
+
+            amplitudes[state] = amplitude
+
+        self.amplitudes = amplitudes
+
+    def iswap_sqrt(self, qubit1, qubit2, controls=None):
+        mask, value = self._controls_mask(controls)
+        bits = (1 << qubit1) | (1 << qubit2)
+
+        amplitudes = {}
+
+        for state, amplitude in self.amplitudes.items():
+            if state & mask == value and (state >> qubit1) & 1 != (state >> qubit2) & 1:
+                for new_state, new_amplitude in [(state, amplitude), (state ^ bits, times_i(amplitude))]:
+                    amplitudes[new_state] = add(amplitudes.get(new_state, ZERO), new_amplitude)
+            else:
+                amplitudes[state] = add(amplitudes.get(state, ZERO), times_sqrt2(amplitude))
+
+        self.amplitudes = {state: amplitude for state, amplitude in amplitudes.items() if amplitude != ZERO}
+        self._simplify()
+
+    def _simplify(self):
+        while True:
+            amplitudes = {}
+
+            for state, amplitude in self.amplitudes.items():
+                amplitude = divide_sqrt2(amplitude)
+
+                if amplitude is None:
+                    return
+
+                amplitudes[state] = amplitude
+
+            self.amplitudes = amplitudes
+
+    def _weight(self, amplitude):
+        x, y = norm_squared(amplitude)
+
+        return x + y * math.sqrt(2)
+
+    """
+        Returns the exact probability of every outcome of measuring the qubits.
+        Each one is given as a pair of fractions (x, y) meaning x + y*sqrt(2).
+    """
+    def get_probabilities(self, qubits):
+        weights = {}
+
+        for state, amplitude in self.amplitudes.items():
+            outcome = tuple((state >> qubit) & 1 for qubit in qubits)
+            x, y = weights.get(outcome, (0, 0))
+            dx, dy = norm_squared(amplitude)
+
+            weights[outcome] = (x + dx, y + dy)
+
+        total_x = sum(x for x, y in weights.values())
+        total_y = sum(y for x, y in weights.values())
+
+        #(x + y*sqrt(2)) / (tx + ty*sqrt(2)), multiplying both by (tx - ty*sqrt(2))
+        denominator = total_x**2 - 2*total_y**2
+
+        return {
+            outcome: (
+                Fraction(x*total_x - 2*y*total_y, denominator),
+                Fraction(y*total_x - x*total_y, denominator)
+            )
+            for outcome, (x, y) in weights.items()
+        }
+
+    """
+        Measures the qubits and returns their values in the same order. The outcome is
+        drawn with the exact probabilities rounded to floating point numbers, but the
+        amplitudes that are kept are exactly the ones of that outcome.
+    """
+    def measure(self, qubits):
+        probabilities = self.get_probabilities(qubits)
+
+        outcomes = list(probabilities.keys())
+        weights = [float(x) + float(y) * math.sqrt(2) for x, y in probabilities.values()]
+        total = sum(weights)
+
+        outcome = outcomes[self.rng.choice(len(outcomes), p=[weight / total for weight in weights])]
+
+        self.amplitudes = {
+            state: amplitude for state, amplitude in self.amplitudes.items()
+            if tuple((state >> qubit) & 1 for qubit in qubits) == outcome
+        }
+        self._simplify()
+
+        return list(outcome)
@@ -0,0 +1,24 @@
+from .sparse_state import SparseState
+from .exact_state import ExactSparseState
+
+from qchess.engines.numpy.numpy_engine import NumpyEngine
+
+"""
+Same as NumpyEngine, but the state only holds the basis states
+(classical boards) that have a nonzero amplitude.
+
+Used for big boards, where the statevector would be too large
+even if only a few pieces are entangled.
+"""
+class SparseEngine(NumpyEngine):
+    state_class = SparseState
+
+"""
+Same as SparseEngine, but the amplitudes are stored exactly
+instead of as floating point numbers.
+"""
+class ExactSparseEngine(SparseEngine):
+    state_class = ExactSparseState
+
+    #the fused gadgets are floating point matrices
+    fuse_gadgets = False
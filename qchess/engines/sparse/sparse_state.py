@@ -0,0 +1,197 @@
+import math
+
+import numpy as np
+
+#amplitudes with a smaller magnitude are considered to be 0
+AMPLITUDE_EPSILON = 1e-10
+
+"""
+State of a register of qubits stored as a sparse superposition of basis states.
+
+Each basis state is packed in an integer (bit i holds the value of qubit i)
+and only the ones with a nonzero amplitude are stored, in a dict that maps
+them to their amplitudes. Since every move gadget maps each basis state to
+at most two others, memory and time scale with the number of states in the
+superposition instead of with the number of qubits.
+
+It has the same interface as StateVector, so it can be used by the gadgets in nutils.
+"""
+class SparseState:
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+        self.amplitudes = {0: 1}
+
+        #probability of every qubit being |1> in the dict of amplitudes
+        #they were calculated from (all the gates create a new one)
+        self.marginals = None
+        self.marginals_amplitudes = None
+
+        self.rng = np.random.default_rng()
+
+    """
+        Returns the mask and value that the basis states must match for the
+        controls to be satisfied.
+    """
+    def _controls_mask(self, controls):
+        mask = 0
+        value = 0
+
+        if controls:
+            for qubit, control_value in controls.items():
+                mask |= 1 << qubit
+                value |= control_value << qubit
+
+        return mask, value
+
+    def x(self, qubit, controls=None):
+        mask, value = self._controls_mask(controls)
+        bit = 1 << qubit
+
+        amplitudes = {}
+
+        for state, amplitude in self.amplitudes.items():
+            if state & mask == value:
+                state ^= bit
+
+            amplitudes[state] = amplitude
+
+        self.amplitudes = amplitudes
+
+    def iswap(self, qubit1, qubit2, controls=None):
+        mask, value = self._controls_mask(controls)
+        bits = (1 << qubit1) | (1 << qubit2)
+
+        amplitudes = {}
+
+        for state, amplitude in self.amplitudes.items():
+            #only |01> and |10> change
+            if state & mask == value and (state >> qubit1) & 1 != (state >> qubit2) & 1:
+                state ^= bits
+                amplitude *= 1j
+
+            amplitudes[state] = amplitude
+
+        self.amplitudes = amplitudes
+
+    def iswap_sqrt(self, qubit1, qubit2, controls=None):
+        mask, value = self._controls_mask(controls)
+        bits = (1 << qubit1) | (1 << qubit2)
+
+        amplitudes = {}
+
+        for state, amplitude in self.amplitudes.items():
+            if state & mask == value and (state >> qubit1) & 1 != (state >> qubit2) & 1:
+                #every state is split in itself and the swapped one
+                for new_state, new_amplitude in [(state, amplitude), (state ^ bits, 1j * amplitude)]:
+                    amplitudes[new_state] = amplitudes.get(new_state, 0) + new_amplitude / math.sqrt(2)
+            else:
+                amplitudes[state] = amplitudes.get(state, 0) + amplitude
+
+        #remove the states that cancelled out
+        self.amplitudes = {
+            state: amplitude for state, amplitude in amplitudes.items()
+            if abs(amplitude) > AMPLITUDE_EPSILON
+        }
+
+    """
+        Applies a unitary given as a NumPy matrix to the qubits
+        (the first one being the least significant of the matrix).
+    """
+    def unitary(self, matrix, qubits):
+        mask = sum(1 << qubit for qubit in qubits)
+
+        def get_state(index):
+            return sum(((index >> i) & 1) << qubit for i, qubit in enumerate(qubits))
+
+        #nonzero entries of every column, as (state bits, amplitude)
+        columns = [
+            [(get_state(int(row)), matrix[row, column]) for row in np.flatnonzero(matrix[:, column])]
+            for column in range(len(matrix))
+        ]
+
+        amplitudes = {}
+
+        for state, amplitude in self.amplitudes.items():
+            index = sum(((state >> qubit) & 1) << i for i, qubit in enumerate(qubits))
+            rest = state & ~mask
+
+            for bits, value in columns[index]:
+                new_state = rest | bits
+                amplitudes[new_state] = amplitudes.get(new_state, 0) + value * amplitude
+
+        self.amplitudes = {
+            state: amplitude for state, amplitude in amplitudes.items()
+            if abs(amplitude) > AMPLITUDE_EPSILON
+        }
+
+    """
+        Returns |amplitude|^2, relative to the other ones.
+    """
+    def _weight(self, amplitude):
+        return abs(amplitude)**2
+
+    """
+        Returns the probability of each qubit being |1>, without measuring them.
+    """
+    def get_marginals(self, qubits):
+        if not self.marginals_amplitudes is self.amplitudes:
+            weights = np.zeros(self.num_qubits)
+            total = 0
+
+            for state, amplitude in self.amplitudes.items():
+                weight = self._weight(amplitude)
+                total += weight
+
+                while state:
+                    bit = state & -state
+                    weights[bit.bit_length() - 1] += weight
+                    state ^= bit
+
+            self.marginals = weights / total
+            self.marginals_amplitudes = self.amplitudes
+
+        return [self.marginals[qubit] for qubit in qubits]
+
+    """
+        Returns n samples of the values of the qubits as an array of shape (n, len(qubits)),
+        drawn from the same distribution as measure (with rng) but without changing the state.
+    """
+    def sample(self, qubits, n, rng):
+        states = list(self.amplitudes.keys())
+        weights = np.array([self._weight(amplitude) for amplitude in self.amplitudes.values()])
+
+        #the basis states might not fit in a NumPy integer, so they are indexed instead
+        values = np.array([[(state >> qubit) & 1 for qubit in qubits] for state in states], dtype=int)
+        values = values.reshape(len(states), len(qubits))
+
+        return values[rng.choice(len(states), size=n, p=weights / weights.sum())]
+
+    def reset(self, qubit):
+        if self.measure([qubit])[0] == 1:
+            self.x(qubit)
+
+    """
+        Measures the qubits and returns their values in the same order.
+    """
+    def measure(self, qubits):
+        def get_outcome(state):
+            return tuple((state >> qubit) & 1 for qubit in qubits)
+
+        probabilities = {}
+
+        for state, amplitude in self.amplitudes.items():
+            outcome = get_outcome(state)
+            probabilities[outcome] = probabilities.get(outcome, 0) + abs(amplitude)**2
+
+        outcomes = list(probabilities.keys())
+        weights = np.array(list(probabilities.values()))
+
+        outcome = outcomes[self.rng.choice(len(outcomes), p=weights / weights.sum())]
+        norm = math.sqrt(probabilities[outcome])
+
+        self.amplitudes = {
+            state: amplitude / norm for state, amplitude in self.amplitudes.items()
+            if get_outcome(state) == outcome
+        }
+
+        return list(outcome)
@@ -2,18 +2,36 @@ import PySimpleGUI as sg
 import os
 import time
 
+import numpy as np
+
 from .engines.qiskit.qiskit_engine import QiskitEngine
+from .engines.numpy.numpy_engine import NumpyEngine
+from .engines.sparse.sparse_engine import SparseEngine, ExactSparseEngine
 from .point import Point
 from .piece import *
 from .pawn import Pawn
 
+#engines that can be selected by name
+ENGINES = {
+    'qiskit': QiskitEngine,
+    'numpy': NumpyEngine,
+    'sparse': SparseEngine,
+    'exact': ExactSparseEngine
+}
+
 class QChess:
-    def __init__(self, width, height, game_mode=None):
+    def __init__(self, width, height, game_mode=None, engine=None, seed=None):
         #default values
         self.current_turn = Color.WHITE
         self.pawn_double_step_allowed = True
         self.pawn_promotion_allowed = True
 
+        #default engine is QiskitEngine
+        engine_name = 'qiskit'
+
+        #seed of all the random outcomes of the game (random if None)
+        self.seed = None
+
         if game_mode:
             assert('board' in game_mode)
 
@@ -30,6 +48,14 @@ class QChess:
             if 'pawn_promotion_allowed' in game_mode:
                 self.pawn_promotion_allowed = game_mode['pawn_promotion_allowed']
 
+            #the engine used to simulate the game
+            if 'engine' in game_mode:
+                engine_name = game_mode['engine']
+
+            #makes every game of the mode play out the same way given the same moves
+            if 'seed' in game_mode:
+                self.seed = game_mode['seed']
+
             height = len(game_mode['board'])
             assert(height > 0)
             width = len(game_mode['board'][0])
@@ -39,9 +65,17 @@ class QChess:
 
         self.board = [[NullPiece for y in range(height)] for x in range(width)]
 
-        #default engine is QiskitEngine
-        #TODO: Read engine from game_mode dict
-        self.engine = QiskitEngine(self, width, height)
+        #the engine and seed arguments have priority over the game mode
+        if engine:
+            engine_name = engine
+
+        if seed is not None:
+            self.seed = seed
+
+        if not engine_name in ENGINES:
+            raise ValueError("Invalid engine '{}'".format(engine_name))
+
+        self.engine = ENGINES[engine_name](self, width, height)
         
         #holds the position of the captureable en passant pawn
         #none if the last move wasn't a pawn's double step
@@ -611,6 +645,19 @@ class QChess:
 
         return m
 
+    """
+        Returns n boards (in the format of get_simplified_matrix) sampled
+        from the current state of the game, without collapsing anything.
+    """
+    def sample_boards(self, n):
+        #rows of the samples are indexed like the array of the board
+        notations = np.array([self.get_piece(i).as_notation() for i in range(self.width * self.height)])
+        occupied = self.engine.sample_squares(n)
+
+        boards = np.where(occupied, notations, '0')
+
+        return boards.reshape(n, self.height, self.width).tolist()
+
     def collapse_board(self):
         self.engine.collapse_all()
 
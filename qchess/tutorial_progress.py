@@ -5,8 +5,10 @@ import json
 from .tutorial_qchess import TutorialQChess
 
 class TutorialProgress:
-    def __init__(self, is_ascii):
+    def __init__(self, is_ascii, engine=None, seed=None):
         self.is_ascii = is_ascii
+        self.engine = engine
+        self.seed = seed
 
         self.config_path = 'tutorials/progress'
         self.template_path = 'tutorials/progress_template'
@@ -125,7 +127,7 @@ class TutorialProgress:
                 print('Error while loading tutorial file {} - File not found'.format(first))
                 return
 
-            qchess = TutorialQChess(json.load(json_data))
+            qchess = TutorialQChess(json.load(json_data), engine=self.engine, seed=self.seed)
 
             #run the main loop
             if self.is_ascii:
@@ -20,8 +20,8 @@ def _perform_check_action(obj_list, action):
     return modified_list
 
 class TutorialQChess(QChess):
-    def __init__(self, tutorial_mode):
-        super().__init__(0, 0, game_mode=tutorial_mode)
+    def __init__(self, tutorial_mode, engine=None, seed=None):
+        super().__init__(0, 0, game_mode=tutorial_mode, engine=engine, seed=seed)
 
         self.move_types = [
             {'name': 'Standard', 'move_number': 2, 'func': TutorialQChess.standard_move},
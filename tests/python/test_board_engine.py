@@ -0,0 +1,254 @@
+import unittest
+import itertools
+import random
+
+import numpy as np
+
+from qchess.quantum_chess import *
+
+class TestBoardEngine(unittest.TestCase):
+    def brute_force_double_occupancy(self, qchess, source, target):
+        """
+        Reference implementation that tries every placement of the entangled pieces
+        """
+        board = qchess.board
+        target_piece = board[target.x][target.y]
+
+        if target_piece == NullPiece:
+            return False
+
+        path = qchess.get_path_points(source, target)
+        entangled_points = qchess.engine.get_all_entangled_points(target.x, target.y)
+
+        for point in path:
+            if board[point.x][point.y] != NullPiece and not point in entangled_points:
+                return True
+
+        number_of_pieces = len(qchess.engine.entanglement.get_group_labels(target_piece.qflag))
+
+        for pieces in itertools.combinations(entangled_points, number_of_pieces):
+            if target in pieces and any(point in pieces for point in path):
+                return True
+
+        return False
+
+    def random_board(self, width, height):
+        """
+        Board with pieces in random squares and random entanglement between them
+        """
+        qchess = QChess(width, height, engine='numpy')
+        qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+
+        pieces = []
+
+        for x in range(1, width):
+            for y in range(height):
+                if random.random() < 0.3:
+                    qchess.add_piece(x, y, Piece(PieceType.KNIGHT, Color.BLACK))
+                    pieces.append(qchess.board[x][y])
+
+                elif pieces and random.random() < 0.4:
+                    #another possible position of a piece
+                    qchess.engine.set_piece(Point(x, y), random.choice(pieces).copy())
+
+        for i in range(random.randint(0, len(pieces))):
+            qflag1 = random.choice(pieces).qflag
+            qflag2 = random.choice(pieces).qflag
+            qchess.engine.entangle_flags(qflag1, qflag2)
+
+        return qchess
+
+    def test_does_slide_violate_double_occupancy(self):
+        random.seed(0)
+
+        source = Point(0, 0)
+        target = Point(5, 0)
+
+        for i in range(500):
+            qchess = self.random_board(6, 2)
+
+            self.assertEqual(
+                qchess.engine.does_slide_violate_double_occupancy(source, target),
+                self.brute_force_double_occupancy(qchess, source, target)
+            )
+
+    def test_large_entanglement(self):
+        #the number of entangled squares would make the permutations intractable
+        qchess = QChess(20, 2, engine='numpy')
+        qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+
+        for x in range(1, 20):
+            qchess.add_piece(x, 0, Piece(PieceType.KNIGHT, Color.BLACK))
+            qchess.engine.set_piece(Point(x, 1), qchess.board[x][0].copy())
+            qchess.engine.entangle_flags(qchess.board[1][0].qflag, qchess.board[x][0].qflag)
+
+        self.assertTrue(qchess.engine.does_slide_violate_double_occupancy(Point(0, 0), Point(19, 0)))
+
+    def test_entanglement_index(self):
+        random.seed(1)
+
+        for i in range(100):
+            qchess = self.random_board(5, 3)
+
+            for x in range(5):
+                for y in range(3):
+                    qflag = qchess.board[x][y].qflag
+
+                    #every square is entangled with the squares that share some qflag with it
+                    expected = [
+                        Point(i, j) for i in range(5) for j in range(3)
+                        if qflag and qchess.board[i][j].qflag &
+                        sum(qchess.engine.entanglement.get_group_labels(qflag)) != 0
+                    ]
+
+                    self.assertEqual(sorted(qchess.engine.get_all_entangled_points(x, y), key=str), sorted(expected, key=str))
+
+    def test_collapse_by_flag(self):
+        qchess = QChess(4, 1, engine='numpy')
+        qchess.add_piece(1, 0, Piece(PieceType.KING, Color.WHITE))
+        qchess.add_piece(3, 0, Piece(PieceType.KNIGHT, Color.BLACK))
+        qchess.split_move(Point(1, 0), Point(0, 0), Point(2, 0), force=True)
+        qchess.engine.entangle_flags(qchess.board[0][0].qflag, qchess.board[3][0].qflag)
+
+        self.assertEqual(len(qchess.engine.get_all_entangled_points(3, 0)), 3)
+
+        qchess.engine.collapse_point(3, 0)
+
+        #every piece is left alone in its own group
+        for i in range(4):
+            if qchess.board[i][0] != NullPiece:
+                self.assertEqual(qchess.engine.get_all_entangled_points(i, 0), [Point(i, 0)])
+
+    def test_qflag_recycling(self):
+        qchess = QChess(2, 1, engine='numpy')
+        qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+
+        for i in range(50):
+            rook_x = i % 2
+
+            qchess.add_piece(1 - rook_x, 0, Piece(PieceType.KNIGHT, Color.BLACK))
+            qchess.standard_move(Point(rook_x, 0), Point(1 - rook_x, 0))
+
+            self.assertEqual(qchess.board[1 - rook_x][0], Piece(PieceType.ROOK, Color.WHITE))
+
+        #there are never more than two pieces in the board
+        self.assertEqual(qchess.engine.entanglement.next_label, 1 << 2)
+
+    def test_classical_move(self):
+        for incremental in [True, False]:
+            qchess = QChess(4, 1, engine='qiskit')
+            qchess.engine = QiskitEngine(qchess, 4, 1, incremental=incremental)
+            qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+            qchess.add_piece(3, 0, Piece(PieceType.KNIGHT, Color.BLACK))
+
+            qchess.standard_move(Point(0, 0), Point(2, 0))
+            qchess.standard_move(Point(2, 0), Point(3, 0))
+
+            self.assertEqual(qchess.board[3][0], Piece(PieceType.ROOK, Color.WHITE))
+            self.assertTrue(qchess.board[3][0].collapsed)
+
+            if incremental:
+                #the stored values are updated without adding anything to the circuit
+                self.assertEqual(qchess.engine.qcircuit.data, [])
+            else:
+                #no gadget is needed, only the X gates that update the squares
+                for instruction, qargs, cargs in qchess.engine.qcircuit.data:
+                    self.assertEqual(instruction.name, 'x')
+
+            qchess.engine.collapse_all()
+            self.assertEqual(qchess.board[3][0], Piece(PieceType.ROOK, Color.WHITE))
+
+    def test_split_through_target(self):
+        for engine in ENGINES:
+            count = 0
+
+            for seed in range(100):
+                qchess = QChess(4, 1, engine=engine, seed=seed)
+                qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+
+                qchess.split_move(Point(0, 0), Point(1, 0), Point(2, 0))
+
+                #the path to the second target goes through the first one,
+                #so the move can't be applied as a fused gadget
+                qchess.split_move(Point(1, 0), Point(2, 0), Point(3, 0))
+                qchess.engine.collapse_all()
+
+                count += qchess.get_simplified_matrix() == [['0', '0', '0', '0']]
+
+            self.assertAlmostEqual(count / 100, 0.5, delta=0.15, msg=engine)
+
+    def test_square_probabilities(self):
+        for engine in ENGINES:
+            qchess = QChess(3, 3, engine=engine)
+            qchess.add_piece(0, 0, Piece(PieceType.KING, Color.WHITE))
+            qchess.add_piece(2, 2, Piece(PieceType.ROOK, Color.BLACK))
+
+            qchess.split_move(Point(0, 0), Point(0, 1), Point(1, 0))
+            qchess.split_move(Point(0, 1), Point(0, 2), Point(1, 1))
+
+            probabilities = qchess.engine.get_square_probabilities()
+
+            expected = np.zeros(9)
+            expected[qchess.get_array_index(1, 0)] = 0.5
+            expected[qchess.get_array_index(0, 2)] = 0.25
+            expected[qchess.get_array_index(1, 1)] = 0.25
+            expected[qchess.get_array_index(2, 2)] = 1
+
+            self.assertTrue(np.allclose(probabilities, expected), msg=engine)
+
+            #nothing is collapsed
+            self.assertFalse(qchess.get_piece(qchess.get_array_index(1, 0)).collapsed)
+
+    def test_sample_boards(self):
+        for engine in ENGINES:
+            qchess = QChess(4, 1, engine=engine)
+            qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+            qchess.add_piece(3, 0, Piece(PieceType.KING, Color.BLACK))
+
+            qchess.split_move(Point(0, 0), Point(1, 0), Point(2, 0))
+
+            matrix = qchess.get_simplified_matrix()
+            boards = qchess.sample_boards(1000)
+
+            self.assertEqual(len(boards), 1000)
+
+            count = sum(board == [['0', 'R', '0', 'k']] for board in boards)
+            self.assertEqual(count + sum(board == [['0', '0', 'R', 'k']] for board in boards), 1000, msg=engine)
+            self.assertAlmostEqual(count / 1000, 0.5, delta=0.1, msg=engine)
+
+            #the game is left untouched
+            self.assertEqual(qchess.get_simplified_matrix(), matrix)
+            self.assertFalse(qchess.board[1][0].collapsed)
+
+    def test_seed(self):
+        def play(engine, seed, inspect=False):
+            qchess = QChess(3, 3, engine=engine, seed=seed)
+            qchess.add_piece(0, 0, Piece(PieceType.KING, Color.WHITE))
+            qchess.add_piece(2, 2, Piece(PieceType.KING, Color.BLACK))
+
+            moves = [
+                lambda: qchess.split_move(Point(0, 0), Point(1, 0), Point(0, 1)),
+                lambda: qchess.split_move(Point(2, 2), Point(2, 1), Point(1, 2)),
+                lambda: qchess.standard_move(Point(1, 0), Point(1, 1)),
+                lambda: qchess.engine.collapse_all(),
+            ]
+
+            for move in moves:
+                move()
+
+                #queries that only read the state
+                if inspect:
+                    qchess.sample_boards(10)
+                    qchess.engine.get_square_probabilities()
+
+            return qchess.get_simplified_matrix()
+
+        for engine in ENGINES:
+            results = [play(engine, seed) for seed in range(8)]
+
+            #the same seed always gives the same game
+            self.assertEqual([play(engine, seed) for seed in range(8)], results, msg=engine)
+            self.assertGreater(len(set(str(result) for result in results)), 1, msg=engine)
+
+            #even if the state is inspected during the game
+            self.assertEqual([play(engine, seed, inspect=True) for seed in range(8)], results, msg=engine)
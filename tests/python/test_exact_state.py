@@ -0,0 +1,46 @@
+import unittest
+from fractions import Fraction
+
+from qchess.engines.sparse.exact_state import ExactSparseState
+
+class TestExactSparseState(unittest.TestCase):
+    def test_split(self):
+        state = ExactSparseState(2)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+
+        self.assertEqual(state.get_probabilities([0]), {
+            (0,): (Fraction(1, 2), 0),
+            (1,): (Fraction(1, 2), 0)
+        })
+
+    def test_no_drift(self):
+        state = ExactSparseState(2)
+        state.x(0)
+
+        #full iSwaps made of halves, a float state would slowly drift
+        for i in range(1000):
+            state.iswap_sqrt(0, 1)
+
+        self.assertEqual(state.amplitudes, {1: (1, 0, 0, 0)})
+
+    def test_uneven_probabilities(self):
+        state = ExactSparseState(3)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        state.iswap_sqrt(1, 2)
+
+        self.assertEqual(state.get_probabilities([0, 1, 2]), {
+            (1, 0, 0): (Fraction(1, 2), 0),
+            (0, 1, 0): (Fraction(1, 4), 0),
+            (0, 0, 1): (Fraction(1, 4), 0)
+        })
+
+        values = state.measure([0])
+
+        probabilities = state.get_probabilities([1])
+
+        if values[0] == 1:
+            self.assertEqual(probabilities, {(0,): (1, 0)})
+        else:
+            self.assertEqual(probabilities, {(0,): (Fraction(1, 2), 0), (1,): (Fraction(1, 2), 0)})
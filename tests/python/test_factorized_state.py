@@ -0,0 +1,71 @@
+import unittest
+import math
+
+import numpy as np
+
+from qchess.engines.numpy.factorized_state import FactorizedState
+
+class TestFactorizedState(unittest.TestCase):
+    def test_independent_groups(self):
+        state = FactorizedState(4)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        state.x(2)
+        state.iswap_sqrt(2, 3)
+
+        groups = state.get_groups()
+
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(sorted(len(group.amplitudes) for group in groups), [4, 4])
+
+    def test_merge(self):
+        state = FactorizedState(4)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        state.x(2)
+        state.iswap_sqrt(2, 3)
+
+        #links both groups
+        state.iswap(1, 2, controls={0: 0})
+
+        groups = state.get_groups()
+
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(sorted(groups[0].qubits), [0, 1, 2, 3])
+        self.assertAlmostEqual(np.linalg.norm(groups[0].amplitudes), 1)
+
+    def test_measure(self):
+        state = FactorizedState(5)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        state.x(2)
+        state.iswap_sqrt(2, 3)
+        state.x(4)
+
+        other_group = state.groups[2]
+        other_amplitudes = other_group.amplitudes.copy()
+
+        values = state.measure([0, 4])
+
+        self.assertEqual(values[1], 1)
+        self.assertEqual(state.values[1], 1 - values[0])
+        self.assertFalse(state.is_active(0) or state.is_active(1))
+
+        #the other group is left untouched
+        self.assertIs(state.groups[2], other_group)
+        np.testing.assert_allclose(other_group.amplitudes, other_amplitudes)
+
+    def test_measure_probabilities(self):
+        state = FactorizedState(2)
+        state.rng = np.random.default_rng(0)
+
+        count = 0
+
+        for i in range(200):
+            state.x(0)
+            state.iswap_sqrt(0, 1)
+            count += state.measure([0])[0]
+            state.reset(0)
+            state.reset(1)
+
+        self.assertAlmostEqual(count/200, 0.5, delta=0.1)
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from qchess.quantum_chess import *
+from qchess.engines import gadgets
+
+class TestGadgets(unittest.TestCase):
+    def test_unitary(self):
+        for kind, paths in [('slide', (2,)), ('split', (1, 2)), ('merge', (None, 1)), ('castle', (3,))]:
+            matrix = gadgets.get_gadget(kind, paths)
+
+            self.assertTrue(np.allclose(matrix @ matrix.conj().T, np.identity(len(matrix))))
+
+    def test_cache(self):
+        self.assertIs(gadgets.get_gadget('split', (1, 1)), gadgets.get_gadget('split', (1, 1)))
+
+    def test_slide(self):
+        #flag, source, target, control
+        matrix = gadgets.get_gadget('slide', (1,))
+
+        #clear path, the piece moves
+        self.assertEqual(matrix[0b0100, 0b0010], 1j)
+
+        #blocked path, the piece stays and the flag is set
+        self.assertEqual(matrix[0b1011, 0b1010], 1)
+
+    def test_split_slide(self):
+        qchess = QChess(4, 3, engine='sparse')
+        qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+        qchess.add_piece(2, 2, Piece(PieceType.KNIGHT, Color.WHITE))
+
+        #the knight blocks one of the paths of the rook
+        qchess.split_move(Point(2, 2), Point(0, 1), Point(1, 0))
+        qchess.split_move(Point(0, 0), Point(3, 0), Point(0, 2))
+
+        probabilities = {}
+
+        for state, amplitude in qchess.engine.state.amplitudes.items():
+            #only the squares of the board, the flags are left out
+            board = state & ((1 << 12) - 1)
+            probabilities[board] = probabilities.get(board, 0) + abs(amplitude)**2
+
+        rook_right = (1 << qchess.get_array_index(3, 0)) | (1 << qchess.get_array_index(0, 1))
+        rook_up = (1 << qchess.get_array_index(0, 2)) | (1 << qchess.get_array_index(1, 0))
+
+        self.assertEqual(set(probabilities.keys()), {rook_right, rook_up})
+        self.assertAlmostEqual(probabilities[rook_right], 0.5)
+        self.assertAlmostEqual(probabilities[rook_up], 0.5)
@@ -0,0 +1,206 @@
+import unittest
+
+import numpy as np
+from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+from qiskit.circuit.library import iSwapGate, DCXGate
+
+from qchess.quantum_chess import *
+from qchess.engines.qiskit import qutils
+from qchess.engines.qiskit.qiskit_engine import QiskitEngine
+
+class TestQutils(unittest.TestCase):
+    def setUp(self):
+        self.qchess = QChess(5, 2, engine='qiskit')
+        self.qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+
+        #simulate the pieces already added
+        self.qchess.engine.execute()
+
+    def get_gate_names(self):
+        return [instruction.name for instruction, qargs, cargs in self.qchess.engine.qcircuit.data]
+
+    def test_known_empty_path(self):
+        qutils.perform_standard_slide(self.qchess.engine, Point(0, 0), Point(4, 0))
+
+        #the slide is just a jump
+        self.assertEqual(self.get_gate_names(), ['unitary'])
+
+    def test_known_blocked_path(self):
+        self.qchess.add_piece(2, 0, Piece(PieceType.KING, Color.WHITE))
+        self.qchess.engine.execute()
+
+        qutils.perform_standard_slide(self.qchess.engine, Point(0, 0), Point(4, 0))
+
+        self.assertEqual(self.get_gate_names(), [])
+
+    def test_uncertain_path(self):
+        self.qchess.add_piece(2, 1, Piece(PieceType.KING, Color.WHITE))
+        self.qchess.split_move(Point(2, 1), Point(2, 0), Point(3, 1))
+        self.qchess.engine.execute()
+
+        qutils.perform_standard_slide(self.qchess.engine, Point(0, 0), Point(4, 0))
+
+        #only the square of the split king is used as a control
+        #(with a scratch square to hold if the path is blocked, in a single fused gadget)
+        unitary_sizes = [
+            len(qargs) for instruction, qargs, cargs in self.qchess.engine.qcircuit.data
+            if instruction.name == 'unitary'
+        ]
+        self.assertEqual(unitary_sizes, [4])
+
+        #no ancilla qubits are needed
+        self.assertEqual(len(self.qchess.engine.qcircuit.qubits), 10)
+
+    def test_ancilla_fallback(self):
+        qchess = QChess(3, 1, engine='qiskit')
+        qchess.add_piece(0, 0, Piece(PieceType.ROOK, Color.WHITE))
+        qchess.add_piece(1, 0, Piece(PieceType.KING, Color.WHITE))
+        qchess.engine.get_scratch_qubits([Point(0, 0), Point(2, 0), Point(1, 0)])
+
+        #every square is part of the move
+        self.assertEqual(len(qchess.engine.qcircuit.qubits), 4)
+
+    def test_partially_known_condition(self):
+        engine = self.qchess.engine
+
+        #the first bit is measured classically and the second one is simulated
+        engine.qcircuit.measure(engine.get_qubit(0, 0), engine.cbit_paths[0])
+        engine.qcircuit.h(engine.get_qubit(1, 1))
+        engine.qcircuit.measure(engine.get_qubit(1, 1), engine.cbit_paths[1])
+        engine.qcircuit.x(engine.get_qubit(4, 1)).c_if(engine.cbit_paths, 0b11)
+        engine.qcircuit.measure(engine.get_qubit(4, 1), engine.cbit_misc[0])
+
+        bits = engine.execute()
+
+        self.assertEqual(bits[engine.cbit_paths[0]], 1)
+        self.assertEqual(bits[engine.cbit_misc[0]], bits[engine.cbit_paths[1]])
+
+    def test_optimize_instructions(self):
+        circuit = QuantumCircuit(QuantumRegister(3), ClassicalRegister(1))
+
+        #cancel out
+        circuit.x(0)
+        circuit.x(0)
+
+        #merged in a single unitary
+        circuit.unitary(qutils.iSwap_sqrt, [1, 2])
+        circuit.unitary(qutils.iSwap_sqrt, [1, 2])
+
+        circuit.measure(1, 0)
+
+        optimized = qutils.optimize_instructions(circuit.data)
+
+        self.assertEqual([instruction.name for instruction, qargs, cargs in optimized], ['unitary', 'measure'])
+        self.assertTrue(np.allclose(optimized[0][0].to_matrix(), qutils.iSwap.data))
+
+    def test_remove_unmeasured(self):
+        circuit = QuantumCircuit(QuantumRegister(3), ClassicalRegister(1))
+        circuit.x(0)
+        circuit.cx(0, 1)
+        circuit.x(2)
+        circuit.measure(1, 0)
+
+        optimized = qutils.optimize_instructions(circuit.data, measured_only=True)
+
+        #qubit 2 doesn't affect the measurement
+        self.assertEqual([instruction.name for instruction, qargs, cargs in optimized], ['x', 'cx', 'measure'])
+
+    def test_compaction(self):
+        qchess = QChess(3, 3, engine='qiskit')
+        qchess.engine = QiskitEngine(qchess, 3, 3, incremental=False)
+
+        qchess.add_piece(0, 0, Piece(PieceType.KING, Color.WHITE))
+        qchess.split_move(Point(0, 0), Point(0, 1), Point(1, 0))
+
+        #moves back and forth until the circuit is compacted
+        for i in range(qutils.COMPACTION_SIZE):
+            qchess.engine.qcircuit.unitary(qutils.iSwap, [qchess.engine.get_qubit(2, 2), qchess.engine.get_qubit(2, 1)])
+
+        qchess.engine.execute()
+
+        self.assertEqual([instruction.name for instruction, qargs, cargs in qchess.engine.qcircuit.data], ['initialize'])
+
+        #the superposition is kept
+        values = qchess.engine.measure_qubits([qchess.get_array_index(0, 1), qchess.get_array_index(1, 0)])
+        self.assertEqual(sorted(values), [0, 1])
+
+    def test_stored_state(self):
+        qchess = QChess(3, 3, engine='qiskit')
+        qchess.add_piece(0, 0, Piece(PieceType.KING, Color.WHITE))
+
+        qchess.split_move(Point(0, 0), Point(0, 1), Point(1, 0))
+
+        #the split is simulated and its state is stored
+        probabilities = qchess.engine.get_square_probabilities()
+        self.assertAlmostEqual(sum(probabilities), 1)
+        self.assertEqual(len(qchess.engine.live_qubits), 2)
+
+        #the merge is simulated starting from the stored state
+        qchess.merge_move(Point(0, 1), Point(1, 0), Point(0, 0))
+
+        probabilities = qchess.engine.get_square_probabilities()
+        self.assertAlmostEqual(probabilities[qchess.get_array_index(0, 0)], 1)
+        self.assertAlmostEqual(sum(probabilities), 1)
+
+    def test_native_instructions(self):
+        basis_gates = qutils.backend.configuration().basis_gates
+
+        #gates that swap |01> to |10> (up to a phase), the first one the simulator doesn't support is used
+        gate = next((gate for gate in [iSwapGate(), DCXGate()] if not gate.name in basis_gates), None)
+
+        if gate is None:
+            self.skipTest('every gate is supported by the simulator')
+
+        circuit = QuantumCircuit(QuantumRegister(2), ClassicalRegister(1))
+        circuit.x(1)
+        circuit.append(gate, [0, 1])
+        circuit.unitary(qutils.iSwap, [0, 1])
+        circuit.measure(1, 0)
+
+        native_circuit = QuantumCircuit(*circuit.qregs, *circuit.cregs)
+
+        for instruction, qargs, cargs in circuit.data:
+            for native_data in qutils.get_native_instructions(instruction, qargs, cargs, qutils.backend):
+                native_circuit.append(*native_data)
+
+        #the gate is translated, the rest are simulated as they are
+        names = [instruction.name for instruction, qargs, cargs in native_circuit.data]
+        self.assertNotIn(gate.name, names)
+        self.assertEqual(names[0], 'x')
+        self.assertEqual(names[-2:], ['unitary', 'measure'])
+
+        result = qutils.run_circuit(native_circuit, qutils.backend)
+        self.assertEqual(qutils.get_result_bits(result, native_circuit)[native_circuit.clbits[0]], 1)
+
+    def test_capture_slide_single_simulation(self):
+        self.qchess.add_piece(4, 0, Piece(PieceType.KNIGHT, Color.BLACK))
+        self.qchess.add_piece(2, 1, Piece(PieceType.KING, Color.WHITE))
+        self.qchess.split_move(Point(2, 1), Point(2, 0), Point(3, 1))
+        self.qchess.engine.execute()
+
+        executions = []
+        execute = self.qchess.engine.execute
+
+        def count_execute():
+            executions.append(1)
+            return execute()
+
+        self.qchess.engine.execute = count_execute
+        self.qchess.standard_move(Point(0, 0), Point(4, 0))
+
+        #only the path is collapsed, the result of the capture isn't simulated on its own
+        self.assertEqual(len(executions), 1)
+
+    def test_measure_statevector(self):
+        self.qchess.split_move(Point(0, 0), Point(3, 0), Point(0, 1))
+        self.qchess.engine.execute()
+
+        self.qchess.engine.execute = None
+
+        #measured in place, without simulating anything
+        indices = [self.qchess.get_array_index(3, 0), self.qchess.get_array_index(0, 1)]
+        values = self.qchess.engine.measure_qubits(indices)
+
+        self.assertEqual(sorted(values), [0, 1])
+        self.assertEqual(self.qchess.engine.live_qubits, [])
+        self.assertEqual(self.qchess.engine.measure_qubits(indices), values)
@@ -0,0 +1,77 @@
+import unittest
+import math
+
+import numpy as np
+
+from qchess.engines.sparse.sparse_state import SparseState
+
+class TestSparseState(unittest.TestCase):
+    def assertAmplitudes(self, state, expected):
+        """
+        expected maps the values of the qubits to amplitudes
+        """
+        self.assertEqual(len(state.amplitudes), len(expected))
+
+        for values, amplitude in expected.items():
+            basis_state = sum(value << i for i, value in enumerate(values))
+            self.assertAlmostEqual(state.amplitudes.get(basis_state, 0), amplitude, msg=str(values))
+
+    def test_classical_gates(self):
+        state = SparseState(3)
+        state.x(0)
+        state.iswap(0, 1)
+        state.x(2, controls={1: 1})
+
+        self.assertAmplitudes(state, {(0, 1, 1): 1j})
+
+    def test_iswap(self):
+        state = SparseState(2)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        self.assertAmplitudes(state, {(1, 0): 1/math.sqrt(2), (0, 1): 1j/math.sqrt(2)})
+
+        #the second half of a full iSwap
+        state.iswap_sqrt(0, 1)
+        self.assertAmplitudes(state, {(0, 1): 1j})
+
+    def test_large_register(self):
+        #more qubits than any statevector could hold
+        state = SparseState(200)
+        state.x(0)
+        state.iswap_sqrt(0, 150)
+        state.iswap(150, 199, controls={0: 0})
+
+        self.assertAmplitudes(state, {
+            (1,): 1/math.sqrt(2),
+            (0,) * 199 + (1,): -1/math.sqrt(2)
+        })
+
+    def test_measure(self):
+        state = SparseState(4)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        state.iswap(1, 2)
+        state.x(3)
+
+        values = state.measure([2, 3])
+
+        self.assertEqual(values[1], 1)
+
+        #qubits 0 and 2 always have opposite values
+        self.assertEqual(len(state.amplitudes), 1)
+        self.assertEqual(state.measure([0]), [1 - values[0]])
+
+    def test_measure_probabilities(self):
+        state = SparseState(2)
+        state.rng = np.random.default_rng(0)
+
+        count = 0
+
+        for i in range(200):
+            state.x(0)
+            state.iswap_sqrt(0, 1)
+            count += state.measure([0])[0]
+            state.reset(0)
+            state.reset(1)
+
+        self.assertAlmostEqual(count/200, 0.5, delta=0.1)
@@ -0,0 +1,103 @@
+import unittest
+import math
+
+import numpy as np
+
+from qchess.engines.numpy.statevector import StateVector
+
+class TestStateVector(unittest.TestCase):
+    def assertAmplitudes(self, state, expected):
+        """
+        expected maps the values of the active qubits (in state.qubits order) to amplitudes
+        """
+        self.assertEqual(len(state.amplitudes), 2**len(state.qubits))
+
+        for i, amplitude in enumerate(state.amplitudes):
+            values = tuple((i >> j) & 1 for j in range(len(state.qubits)))
+            self.assertAlmostEqual(amplitude, expected.get(values, 0), msg=str(values))
+
+    def test_classical_gates(self):
+        state = StateVector(3)
+        state.x(0)
+        state.iswap(0, 1)
+        state.x(2, controls={1: 1})
+
+        #no gate leaves a superposition, so nothing has to be stored
+        self.assertEqual(state.qubits, [])
+        self.assertEqual(state.values, [0, 1, 1])
+
+    def test_iswap(self):
+        state = StateVector(3)
+        state.iswap_sqrt(0, 1)
+        state.x(0)
+
+        self.assertEqual(state.qubits, [])
+
+        state.iswap_sqrt(0, 1)
+        self.assertAmplitudes(state, {(1, 0): 1/math.sqrt(2), (0, 1): 1j/math.sqrt(2)})
+
+        state.iswap(0, 1)
+        self.assertAmplitudes(state, {(0, 1): 1j/math.sqrt(2), (1, 0): -1/math.sqrt(2)})
+
+    def test_controls(self):
+        state = StateVector(3)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+
+        #only swaps the state in which qubit 0 is |0>
+        state.iswap(1, 2, controls={0: 0})
+        self.assertEqual(state.qubits, [0, 1, 2])
+        self.assertAmplitudes(state, {(1, 0, 0): 1/math.sqrt(2), (0, 0, 1): -1/math.sqrt(2)})
+
+        #never applied
+        state.x(0, controls={1: 1})
+        self.assertAmplitudes(state, {(1, 0, 0): 1/math.sqrt(2), (0, 0, 1): -1/math.sqrt(2)})
+
+    def test_unitary(self):
+        state = StateVector(3)
+        other = StateVector(3)
+
+        for s in [state, other]:
+            s.x(0)
+            s.iswap_sqrt(0, 1)
+
+        #same as iswap(2, 1) controlled by qubit 0 being |0>,
+        #with qubit 2 as the least significant one of the matrix
+        matrix = np.identity(8, dtype=complex)
+        matrix[[0b001, 0b010]] = 1j * matrix[[0b010, 0b001]]
+
+        state.unitary(matrix, [2, 1, 0])
+        other.iswap(2, 1, controls={0: 0})
+
+        self.assertEqual(state.qubits, [0, 1, 2])
+        self.assertTrue(np.allclose(state.amplitudes, other.amplitudes))
+
+    def test_measure(self):
+        state = StateVector(4)
+        state.x(0)
+        state.iswap_sqrt(0, 1)
+        state.iswap(1, 2)
+        state.x(3)
+
+        values = state.measure([2, 3])
+
+        self.assertEqual(values[1], 1)
+
+        #qubits 0 and 2 always have opposite values
+        self.assertEqual(state.values[0], 1 - values[0])
+        self.assertEqual(state.qubits, [])
+
+    def test_measure_probabilities(self):
+        state = StateVector(2)
+        state.rng = np.random.default_rng(0)
+
+        count = 0
+
+        for i in range(200):
+            state.x(0)
+            state.iswap_sqrt(0, 1)
+            count += state.measure([0])[0]
+            state.reset(0)
+            state.reset(1)
+
+        self.assertAlmostEqual(count/200, 0.5, delta=0.1)
@@ -6,5 +6,21 @@ standard_delta = 0.07
 entangle_shots = 100
 entangle_delta = 0.00
 
+#number of processes the shots of each test are spread across
+#(each one is forked from the test process, so it only works on unix)
+processes = 1
+
 #will print obtained probabilities vs expected after each test
-display_probabilities = False
\ No newline at end of file
+display_probabilities = False
+
+#engine used to simulate the games (any of the ENGINES in qchess/quantum_chess.py)
+engine_name = 'qiskit'
+
+#if true, the exact probability of every result is calculated by exploring all the
+#outcomes of the measurements, instead of running each test many times
+#(shots, delta and engine_name are ignored, so qiskit is not tested)
+exact_distribution = False
+
+#engine used when exact_distribution is true
+#(only the numpy, sparse and exact engines measure with a random generator that can be replaced)
+exact_engine_name = 'exact'
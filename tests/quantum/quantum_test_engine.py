@@ -1,12 +1,82 @@
 #import shots and delta default values
 from . import *
 
+import copy
+import multiprocessing
+
+import numpy as np
+
 from qchess.quantum_chess import QChess
+from qchess.engines.qiskit import qutils
+
+#outcomes less likely than this are not explored
+BRANCH_EPSILON = 1e-10
+
+#test engine whose shots are run by the worker processes, which get it when they
+#are forked (board factories and actions are usually lambdas that can't be pickled)
+_running_engine = None
+
+def _run_shots(args):
+    n, seed = args
+    return _running_engine.run_shots(n, seed)
+
+"""
+Used instead of the random generator of the engine to explore every possible
+outcome of the measurements. The first ones are taken from outcomes, and after
+that the first possible outcome is always picked and the rest are saved
+in branches (as the outcomes required to reach them) to be explored later.
+"""
+class OutcomeBranches():
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.taken = []
+        self.branches = []
+        self.prob = 1
+
+    def choice(self, a, p):
+        possible = [i for i in range(a) if p[i] > BRANCH_EPSILON]
+
+        if len(self.taken) < len(self.outcomes):
+            outcome = self.outcomes[len(self.taken)]
+        else:
+            outcome = possible[0]
+
+            for other in possible[1:]:
+                self.branches.append(self.taken + [other])
+
+        self.taken.append(outcome)
+        self.prob *= p[outcome]
+
+        return outcome
+
+"""
+Used instead of the random generator of the engine to find out if
+any measurement with more than one possible outcome has been performed
+(or any simulation that can measure has been seeded, see QiskitEngine.run_circuit).
+"""
+class DrawCounter():
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = 0
+
+    def choice(self, a, size=None, p=None):
+        if p is None or len([prob for prob in p if prob > BRANCH_EPSILON]) > 1:
+            self.draws += 1
+
+        return self.rng.choice(a, size=size, p=p)
+
+    def integers(self, *args, **kwargs):
+        self.draws += 1
+
+        return self.rng.integers(*args, **kwargs)
 
 class QuantumTestEngine():
-    def __init__(self):
+    #if fork_factory is false, the board factory is applied again in every shot
+    #instead of copying the state it leaves (see run_board_factory)
+    def __init__(self, fork_factory=True):
         self.posible_bstates = []
         self.done = False
+        self.fork_factory = fork_factory
 
     def add_board_state(self, state, prob):
         self.posible_bstates.append({'state': state, 'prob': prob, 'count': 0})
@@ -25,16 +95,127 @@ class QuantumTestEngine():
         assert(self.width > 0 and self.height > 0)
         assert(self.board_factory)
 
+        if exact_distribution:
+            self.run_exact()
+            return
+
         self.n = n
+        self.factory_qchess = self.run_board_factory() if self.fork_factory else None
+
+        #every process gets its share of the shots and its own seed
+        shots = [n // processes + (i < n % processes) for i in range(processes)]
+        seeds = np.random.SeedSequence().spawn(processes)
+
+        if processes > 1:
+            global _running_engine
+            _running_engine = self
+
+            #all the shots of the test are run by a single pool, whose
+            #processes get the test engine when they are forked
+            with multiprocessing.get_context('fork').Pool(processes, qutils.reset_after_fork) as pool:
+                results = pool.map(_run_shots, zip(shots, seeds))
+        else:
+            results = [self.run_shots(n, seeds[0])]
+
+        for counts in results:
+            for bstate, count in zip(self.posible_bstates, counts):
+                bstate['count'] += count
+
+        self.done = True
+
+    """
+        Runs n shots and returns how many times each board state was obtained.
+        The random generator of every shot is seeded from seed.
+    """
+    def run_shots(self, n, seed):
+        counts = [0] * len(self.posible_bstates)
+
+        for shot_seed in seed.spawn(n):
+            rng = np.random.default_rng(shot_seed)
+
+            if self.factory_qchess:
+                qchess = self.fork(self.factory_qchess, rng)
+            else:
+                qchess = QChess(self.width, self.height, engine=engine_name)
+                qchess.engine.rng = rng
+                qchess.engine.reset_state()
+
+                self.board_factory(qchess)
+
+            self.action(qchess)
+
+            for i, bstate in enumerate(self.posible_bstates):
+                if bstate['state'] == qchess.get_simplified_matrix():
+                    counts[i] += 1
+                    break
+
+        return counts
+
+    """
+        Returns a game with the board factory already applied, that can be forked
+        for every shot instead of applying it again. Returns None if the factory
+        measured anything, since then every shot has to get its own outcome.
+    """
+    def run_board_factory(self):
+        qchess = QChess(self.width, self.height, engine=engine_name)
+        engine = qchess.engine
+
+        draws = DrawCounter(engine.rng)
+        engine.rng = draws
+        engine.reset_state()
+
+        self.board_factory(qchess)
+
+        #the gates of the factory are simulated only once
+        engine.get_square_probabilities()
+
+        if draws.draws:
+            return None
+
+        return qchess
+
+    """
+        Copies the game (including the state of the engine), replacing
+        its random generator by rng in the copy.
+    """
+    def fork(self, qchess, rng):
+        memo = {id(qchess.engine.rng): rng}
+
+        #registers never change, so all the forks can share them
+        if hasattr(qchess.engine, 'qcircuit'):
+            for register in qchess.engine.qcircuit.qregs + qchess.engine.qcircuit.cregs:
+                memo[id(register)] = register
+
+                for bit in register:
+                    memo[id(bit)] = bit
+
+        return copy.deepcopy(qchess, memo)
+
+    """
+        Calculates the probability of every board state by replaying the game
+        once for every combination of measurement outcomes.
+    """
+    def run_exact(self):
+        #the counts hold probabilities, so that run_tests can be used as is
+        self.n = 1
+
+        pending = [[]]
+
+        while pending:
+            branches = OutcomeBranches(pending.pop())
+
+            qchess = QChess(self.width, self.height, engine=exact_engine_name)
+            qchess.engine.rng = branches
+            qchess.engine.reset_state()
 
-        for i in range(n):
-            qchess = QChess(self.width, self.height)
             self.board_factory(qchess)
             self.action(qchess)
 
+            pending += branches.branches
+
             for bstate in self.posible_bstates:
                 if bstate['state'] == qchess.get_simplified_matrix():
-                    bstate['count'] += 1
+                    bstate['count'] += branches.prob
                     break
 
         self.done = True
@@ -42,6 +223,11 @@ class QuantumTestEngine():
     def run_tests(self, test_case, places=None, delta=None):
         assert(self.done)
 
+        #the probabilities are exact (up to floating point errors)
+        if exact_distribution:
+            places = None
+            delta = None
+
         if display_probabilities:
             print()
 
@@ -0,0 +1,66 @@
+import unittest
+
+#import shots and delta default values
+from . import *
+
+from qchess.quantum_chess import *
+from .quantum_test_engine import QuantumTestEngine
+
+class TestQuantumTestEngine(unittest.TestCase):
+    def test_fork_factory(self):
+        frequencies = []
+
+        for fork_factory in [True, False]:
+            engine = QuantumTestEngine(fork_factory)
+            engine.add_board_state(
+                [
+                    ['0', 'K', '0'],
+                    ['0', '0', '0'],
+                    ['0', '0', '0'],
+                ],
+                0.5
+            )
+
+            engine.add_board_state(
+                [
+                    ['0', '0', '0'],
+                    ['0', '0', 'K'],
+                    ['0', '0', '0'],
+                ],
+                0.25
+            )
+
+            engine.add_board_state(
+                [
+                    ['0', '0', '0'],
+                    ['0', '0', '0'],
+                    ['K', '0', '0'],
+                ],
+                0.25
+            )
+
+            def board_factory(qchess):
+                qchess.add_piece(0, 0, Piece(PieceType.KING, Color.WHITE))
+                qchess.split_move(Point(0, 0), Point(1, 0), Point(0, 1))
+                qchess.split_move(Point(0, 1), Point(0, 2), Point(1, 1))
+
+            #the move is simulated starting from the state left by the factory
+            def action(qchess):
+                qchess.standard_move(Point(1, 1), Point(2, 1))
+                qchess.engine.collapse_all()
+
+            engine.set_board_factory(3, 3, board_factory)
+            engine.set_action(action)
+            engine.run_engine(standard_shots)
+
+            if fork_factory and not exact_distribution:
+                #the factory doesn't measure anything, so its state is forked
+                self.assertIsNotNone(engine.factory_qchess)
+
+            engine.run_tests(self, delta=standard_delta)
+
+            frequencies.append([bstate['count'] / engine.n for bstate in engine.posible_bstates])
+
+        #forking the factory gives the same distribution as replaying it
+        for forked, replayed in zip(*frequencies):
+            self.assertAlmostEqual(forked, replayed, delta=2 * standard_delta)